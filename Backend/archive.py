@@ -0,0 +1,89 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne
+
+ARCHIVE_AFTER_HOURS = float(os.getenv("ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "300"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Statuses a game never leaves, so it is safe to move it out of the live set
+ARCHIVED_STATUSES = ["completed", "expired"]
+
+
+class GameArchiver:
+    """Moves finished games out of the live games collection.
+
+    Completed and expired games whose listing window closed more than
+    ``archive_after`` ago are copied into the archive collection and then
+    removed from the live one, a batch at a time. Copies are upserts keyed
+    on _id, so a pass interrupted between the two steps (or several workers
+    archiving at once) just repeats the copy next time.
+    """
+
+    def __init__(self, archive_after_hours=ARCHIVE_AFTER_HOURS, interval=ARCHIVE_INTERVAL_SECONDS, batch_size=ARCHIVE_BATCH_SIZE, on_archived=None):
+        self.archive_after = timedelta(hours=archive_after_hours)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_archived = on_archived
+        self.collection = None
+        self.archive_collection = None
+        self.archived_count = 0
+        self._task = None
+
+    async def start(self, collection, archive_collection):
+        self.collection = collection
+        self.archive_collection = archive_collection
+        if self.archive_after.total_seconds() > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def archive_batch(self, now=None):
+        # expires_at is created_at plus the listing window, and is indexed
+        # together with status
+        cutoff = (now or datetime.utcnow()) - self.archive_after
+        # Results still waiting for their rating update stay live until rated
+        query = {"status": {"$in": ARCHIVED_STATUSES}, "expires_at": {"$lt": cutoff}, "ratings_pending": {"$ne": True}}
+        games = await self.collection.find(query).limit(self.batch_size).to_list(length=self.batch_size)
+        if not games:
+            return 0
+
+        archived_at = datetime.utcnow()
+        await self.archive_collection.bulk_write(
+            [ReplaceOne({"_id": game["_id"]}, {**game, "archived_at": archived_at}, upsert=True) for game in games],
+            ordered=False
+        )
+        result = await self.collection.delete_many({
+            "_id": {"$in": [game["_id"] for game in games]},
+            "status": {"$in": ARCHIVED_STATUSES}
+        })
+        self.archived_count += result.deleted_count
+        if result.deleted_count and self.on_archived is not None:
+            self.on_archived(result.deleted_count)
+        return result.deleted_count
+
+    async def archive_all(self, now=None):
+        total = 0
+        while True:
+            moved = await self.archive_batch(now)
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error archiving games: {str(e)}")
+            await asyncio.sleep(self.interval)
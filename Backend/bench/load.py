@@ -0,0 +1,329 @@
+"""Load test: seed a database, drive a traffic mix through the ASGI app and
+report throughput and latency percentiles per endpoint as JSON.
+
+    python bench/load.py run [--users 1000] [--games 10000] [--concurrency 50]
+                             [--duration 20] [--output run.json]
+    python bench/load.py compare baseline.json run.json [--threshold 0.15]
+
+``run`` uses an in-memory mongomock_motor database by default. It has no
+indexes and serializes every operation, so only compare runs made against
+the same backend. Pass --mongo-url to use a local mongod, which is the only
+sensible choice for large volumes such as --users 100000 --games 1000000.
+The app always uses the ``userdb`` database there, so a non-empty database
+is refused unless --reset is given.
+
+``compare`` exits with status 1 when an endpoint's p95 latency grew, or its
+throughput dropped, by more than the threshold.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+BENCH_PASSWORD = "benchmark-password"
+
+# (name, weight); weights are relative
+TRAFFIC_MIX = [
+    ("POST /token", 2),
+    ("GET /games", 30),
+    ("GET /games open 5v5", 20),
+    ("GET /games/party/{party_id}", 10),
+    ("GET /parties/{user_id}", 10),
+    ("GET /users/search", 8),
+    ("POST /games/{game_id}/join", 10),
+    ("POST /games/{game_id}/ready", 10),
+]
+
+SEEDED_COLLECTIONS = ["users", "parties", "games", "games_archive", "invitations", "ratings"]
+
+
+class State:
+    """Seeded ids the traffic picks from."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.users = []  # (id, email, name)
+        self.users_by_id = {}
+        self.parties = []  # (id, member ids)
+        self.joinable = []  # open 1v1 game ids, each joined once
+        self.ready = []  # (game id, player id) in in-progress games
+        self.tokens = {}
+
+    def user(self):
+        return self.rng.choice(self.users)
+
+
+async def insert_batches(collection, docs, batch_size=1000):
+    for start in range(0, len(docs), batch_size):
+        await collection.insert_many(docs[start:start + batch_size], ordered=False)
+
+
+async def seed(main, state, users, games):
+    from bson import ObjectId
+
+    rng = state.rng
+    hashed_password = await main.get_password_hash(BENCH_PASSWORD)
+    user_docs = []
+    for i in range(users):
+        name, email = f"Player {i}", f"player{i}@bench.local"
+        user_docs.append({
+            "_id": ObjectId(),
+            "email": email,
+            "name": name,
+            "hashed_password": hashed_password,
+            "search_terms": main.search_terms(name, email),
+        })
+        user = (str(user_docs[-1]["_id"]), email, name)
+        state.users.append(user)
+        state.users_by_id[user[0]] = user
+    await insert_batches(main.collection, user_docs)
+
+    party_docs = []
+    for start in range(0, users - 4, 5):
+        members = [state.users[start + offset][0] for offset in range(5)]
+        party_docs.append({"_id": ObjectId(), "name": f"Party {start // 5}", "creator_id": members[0], "members": members, "member_count": len(members)})
+        state.parties.append((str(party_docs[-1]["_id"]), members))
+    await insert_batches(main.party_collection, party_docs)
+
+    now = datetime.utcnow()
+    game_docs = []
+    for i in range(games):
+        roll = rng.random()
+        creator_id, _, creator_name = state.user()
+        if roll < 0.6:
+            # History: finished games from the last month
+            created_at = now - timedelta(minutes=rng.randint(60, 60 * 24 * 30))
+            game_format, status = rng.choice(["5v5", "4v4", "1v1"]), rng.choice(["completed", "expired"])
+        else:
+            created_at = now - timedelta(seconds=rng.randint(0, 20 * 60))
+            game_format = rng.choice(["5v5", "4v4", "1v1"])
+            status = "in_progress" if roll < 0.75 else "open"
+        party = rng.choice(state.parties) if game_format != "1v1" and state.parties else None
+        max_players = {"5v5": 10, "4v4": 8, "1v1": 2}[game_format]
+        players = [creator_id] if status == "open" else [state.user()[0] for _ in range(max_players)]
+        game_docs.append({
+            "_id": ObjectId(),
+            "party_id": party[0] if party else None,
+            "party_name": f"Party of {creator_name}" if party else "Solo",
+            "creator_id": creator_id,
+            "creator_name": creator_name,
+            "format": game_format,
+            "game_type": "deathmatch" if game_format == "1v1" else rng.choice(["best_of_1", "best_of_3"]),
+            "status": status,
+            "created_at": created_at,
+            "expires_at": created_at + timedelta(minutes=main.GAME_LISTING_MINUTES),
+            "players": players,
+            "ready_players": [],
+            "max_players": max_players,
+            "team1_party_id": party[0] if party else None,
+            "team2_party_id": None,
+        })
+        game_id = str(game_docs[-1]["_id"])
+        if status == "open" and game_format == "1v1":
+            state.joinable.append(game_id)
+        elif status == "in_progress":
+            state.ready.extend((game_id, player) for player in players)
+    await insert_batches(main.game_collection, game_docs)
+    rng.shuffle(state.joinable)
+
+
+def auth(main, state, user):
+    user_id, email, _ = user
+    token = state.tokens.get(user_id)
+    if token is None:
+        token = state.tokens[user_id] = main.create_access_token({"sub": email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def request(main, client, state, operation):
+    rng = state.rng
+    user = state.user()
+    if operation == "POST /token":
+        return await client.post("/token", data={"username": user[1], "password": BENCH_PASSWORD})
+    headers = auth(main, state, user)
+    if operation == "GET /games":
+        return await client.get("/games", headers=headers)
+    if operation == "GET /games open 5v5":
+        return await client.get("/games", params={"open_only": "true", "format": "5v5"}, headers=headers)
+    if operation == "GET /games/party/{party_id}":
+        party_id = rng.choice(state.parties)[0] if state.parties else "none"
+        return await client.get(f"/games/party/{party_id}", headers=headers)
+    if operation == "GET /parties/{user_id}":
+        return await client.get(f"/parties/{user[0]}", params={"expand": "members"}, headers=headers)
+    if operation == "GET /users/search":
+        return await client.get("/users/search", params={"q": f"player {rng.randint(0, 99)}"}, headers=headers)
+    if operation == "POST /games/{game_id}/join":
+        if not state.joinable:
+            return None
+        return await client.post(f"/games/{state.joinable.pop()}/join", headers=headers)
+    if operation == "POST /games/{game_id}/ready":
+        if not state.ready:
+            return None
+        game_id, player_id = rng.choice(state.ready)
+        return await client.post(f"/games/{game_id}/ready", headers=auth(main, state, state.users_by_id[player_id]))
+    raise ValueError(f"Unknown operation: {operation}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest rank
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+        "statuses": statuses,
+        "errors": sum(count for status, count in statuses.items() if status.startswith("5")),
+    }
+
+
+async def drive(main, state, concurrency, duration, max_requests):
+    import httpx
+
+    names = [name for name, _ in TRAFFIC_MIX]
+    weights = [weight for _, weight in TRAFFIC_MIX]
+    samples = {name: [] for name in names}
+    issued = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            operation = state.rng.choices(names, weights)[0]
+            issued += 1
+            started = time.perf_counter()
+            response = await request(main, client, state, operation)
+            if response is not None:
+                samples[operation].append((time.perf_counter() - started, response.status_code))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+async def run(args):
+    os.environ["MONGODB_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    # Keep background jobs and logging from skewing the numbers
+    os.environ.setdefault("ARCHIVE_AFTER_HOURS", "0")
+    os.environ.setdefault("SLOW_REQUEST_MS", "0")
+    main = importlib.import_module("main")
+    if not args.mongo_url:
+        from mongomock_motor import AsyncMongoMockClient
+        main.AsyncIOMotorClient = lambda url, **kwargs: AsyncMongoMockClient()
+
+    await main.startup_db_client()
+    try:
+        existing = await main.collection.estimated_document_count()
+        if existing and not args.reset:
+            print(f"userdb already holds {existing} users; pass --reset to drop the benchmark collections", file=sys.stderr)
+            return 2
+        for name in SEEDED_COLLECTIONS:
+            await main.db[name].delete_many({})
+
+        state = State(random.Random(args.seed))
+        seed_started = time.perf_counter()
+        await seed(main, state, args.users, args.games)
+        seed_seconds = time.perf_counter() - seed_started
+
+        samples, elapsed = await drive(main, state, args.concurrency, args.duration, args.requests)
+    finally:
+        await main.shutdown_db_client()
+
+    all_samples = [sample for endpoint_samples in samples.values() for sample in endpoint_samples]
+    report = {
+        "config": {
+            "backend": "mongodb" if args.mongo_url else "mongomock",
+            "users": args.users,
+            "games": args.games,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "seed": args.seed,
+        },
+        "seed_s": round(seed_seconds, 3),
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize(all_samples, elapsed),
+        "endpoints": {name: summarize(endpoint_samples, elapsed) for name, endpoint_samples in samples.items() if endpoint_samples},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return 0
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, before in baseline["endpoints"].items():
+        after = current["endpoints"].get(name)
+        if after is None or not before.get("p95_ms") or not after.get("p95_ms"):
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append({"endpoint": name, "metric": "p95_ms", "baseline": before["p95_ms"], "current": after["p95_ms"]})
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append({"endpoint": name, "metric": "throughput_rps", "baseline": before["throughput_rps"], "current": after["throughput_rps"]})
+        if after["errors"] > before["errors"]:
+            regressions.append({"endpoint": name, "metric": "errors", "baseline": before["errors"], "current": after["errors"]})
+    if baseline.get("config") != current.get("config"):
+        print("Warning: runs used different configurations", file=sys.stderr)
+    return regressions
+
+
+def main_(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, drive traffic and report")
+    run_parser.add_argument("--mongo-url", help="local mongod to use instead of the in-memory stand-in")
+    run_parser.add_argument("--reset", action="store_true", help="drop existing data in the benchmark collections")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--games", type=int, default=10000)
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--duration", type=float, default=20.0, help="seconds of traffic")
+    run_parser.add_argument("--requests", type=int, help="stop after this many requests")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="also write the report to this file")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative change")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return asyncio.run(run(args))
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    print(json.dumps({"threshold": args.threshold, "regressions": regressions}, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
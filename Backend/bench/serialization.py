@@ -0,0 +1,105 @@
+"""Compare the validated and trusted serialization paths for game listings.
+
+Builds synthetic game documents, serializes them both ways, checks the
+output is byte-identical and prints timings as JSON:
+
+    python bench/serialization.py [--games 200] [--rounds 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+import main  # noqa: E402
+
+
+def make_games(count):
+    now = datetime.utcnow().replace(microsecond=0)
+    games = []
+    for i in range(count):
+        created_at = now - timedelta(minutes=i)
+        status = ("open", "in_progress", "completed")[i % 3]
+        game = {
+            "_id": ObjectId(),
+            "party_id": str(ObjectId()) if i % 2 else None,
+            "party_name": f"Party {i}" if i % 2 else "Solo",
+            "creator_id": str(ObjectId()),
+            "creator_name": f"Player {i}",
+            "format": ("5v5", "4v4", "1v1")[i % 3],
+            "game_type": ("best_of_1", "best_of_3", "deathmatch")[i % 3],
+            "status": status,
+            "created_at": created_at,
+            "expires_at": created_at + timedelta(minutes=main.GAME_LISTING_MINUTES),
+            "players": [str(ObjectId()) for _ in range(1 + i % 10)],
+            "max_players": (10, 8, 2)[i % 3],
+            "match_result": None,
+        }
+        if status == "completed":
+            game["match_result"] = {
+                "winner_id": game["players"][0],
+                "winner_name": "Winner",
+                "loser_id": str(ObjectId()),
+                "loser_name": "Loser",
+                "score": "13-7",
+                "reported_by": game["creator_id"],
+                "reported_at": created_at + timedelta(minutes=40, microseconds=257000),
+            }
+        games.append(game)
+    return games
+
+
+def validated(games, now):
+    return main.listing_fragments([
+        main.game_post_from_doc(game, None, now).model_dump(mode="json") for game in games
+    ])
+
+
+def trusted(games, now):
+    return main.listing_fragments([main.game_json_from_doc(game, now) for game in games])
+
+
+def timed(function, games, now, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(games, now)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "median_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+    }
+
+
+def main_(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    games = make_games(args.games)
+    now = datetime.utcnow()
+    if validated(games, now) != trusted(games, now):
+        print("Trusted serialization does not match the validated output", file=sys.stderr)
+        return 1
+
+    results = {
+        "games": args.games,
+        "rounds": args.rounds,
+        "encoder": "orjson" if main.orjson is not None else "json",
+        "validated": timed(validated, games, now, args.rounds),
+        "trusted": timed(trusted, games, now, args.rounds),
+    }
+    results["speedup"] = round(results["validated"]["median_ms"] / results["trusted"]["median_ms"], 2)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,218 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from datetime import datetime
+from pymongo import ReturnDocument
+
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+EVENT_SUBSCRIBER_QUEUE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE", "256"))
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "0.25"))
+
+# Put on a subscriber's queue when it can no longer be resumed from its
+# offset (it fell too far behind, or asked for an offset we do not have).
+# Clients should refetch the listing and continue from the next event.
+RESET = {"type": "reset"}
+
+# Ends a subscriber's stream; sent to everyone when the worker shuts down so
+# clients reconnect (and resume) elsewhere
+CLOSED = {"type": "closed"}
+
+
+class InProcessBroker:
+    """Delivers events to subscribers of this process only."""
+
+    def __init__(self):
+        self._offsets = itertools.count(1)
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, event):
+        event["offset"] = next(self._offsets)
+        if self._deliver is not None:
+            self._deliver(event)
+
+
+class MongoBroker:
+    """Shares events between workers through a MongoDB collection.
+
+    Offsets come from a counter document so every worker sees the same
+    numbering, and each worker polls the collection for new offsets. A gap
+    (an offset allocated but not yet inserted) holds delivery back for up to
+    ``gap_timeout`` seconds to keep events in order.
+    """
+
+    def __init__(self, db, collection_name="game_events", poll_interval=EVENT_POLL_SECONDS, gap_timeout=2.0):
+        self.events = db[collection_name]
+        self.counters = db.counters
+        self.counter_id = collection_name
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+        self._deliver = None
+        self._task = None
+        self._last_offset = 0
+
+    async def start(self, deliver):
+        self._deliver = deliver
+        latest = await self.events.find_one({}, {"offset": 1}, sort=[("offset", -1)])
+        self._last_offset = latest["offset"] if latest else 0
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, event):
+        counter = await self.counters.find_one_and_update(
+            {"_id": self.counter_id},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        event["offset"] = counter["seq"]
+        await self.events.insert_one({**event, "published_at": datetime.utcnow()})
+
+    async def _poll(self):
+        gap_since = None
+        while True:
+            try:
+                cursor = self.events.find({"offset": {"$gt": self._last_offset}}).sort("offset", 1)
+                async for event in cursor:
+                    if event["offset"] != self._last_offset + 1:
+                        if gap_since is None:
+                            gap_since = time.monotonic()
+                        if time.monotonic() - gap_since < self.gap_timeout:
+                            break
+                    gap_since = None
+                    self._last_offset = event["offset"]
+                    event.pop("_id", None)
+                    event.pop("published_at", None)
+                    self._deliver(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error polling game events: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up; drop the backlog and have it resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    def close(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSED)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class GameEventHub:
+    """Fans game events out to local subscribers and keeps a short history
+    so reconnecting clients can resume from the last offset they saw."""
+
+    def __init__(self, history_size=EVENT_HISTORY_SIZE, queue_size=EVENT_SUBSCRIBER_QUEUE):
+        self.broker = InProcessBroker()
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._closing = False
+        self.published = 0
+        # Bumped for every game change seen by this process; listing caches
+        # are only valid for the version they were built at
+        self.version = 0
+
+    async def start(self, broker=None):
+        if broker is not None:
+            self.broker = broker
+        await self.broker.start(self._deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    async def publish(self, event_type, game_id, game=None, format=None, party_ids=()):
+        event = {
+            "type": event_type,
+            "game_id": str(game_id),
+            "format": format,
+            "party_ids": [party_id for party_id in party_ids if party_id],
+            "game": game,
+        }
+        # Local writes invalidate immediately, before a remote broker echoes them
+        self.version += 1
+        try:
+            await self.broker.publish(event)
+            self.published += 1
+        except Exception as e:
+            # Notifications are best effort; never fail the write that caused them
+            print(f"Error publishing game event: {str(e)}")
+
+    def touch(self):
+        # For changes that no subscriber needs to hear about but that still
+        # make cached listings stale
+        self.version += 1
+
+    def _deliver(self, event):
+        self.version += 1
+        self._history.append(event)
+        for subscription in self._subscribers:
+            subscription.push(event)
+
+    def subscribe(self, since=None):
+        subscription = Subscription(self.queue_size)
+        if self._closing:
+            subscription.close()
+            return subscription
+        if since is not None:
+            oldest = self._history[0]["offset"] if self._history else None
+            latest = self._history[-1]["offset"] if self._history else 0
+            if since > latest or (oldest is not None and since < oldest - 1):
+                subscription.push(RESET)
+            else:
+                for event in self._history:
+                    if event["offset"] > since:
+                        subscription.push(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def close_subscriptions(self):
+        self._closing = True
+        for subscription in self._subscribers:
+            subscription.close()
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+def create_broker(db, kind=EVENT_BROKER):
+    if kind == "memory":
+        return InProcessBroker()
+    if kind == "mongo":
+        return MongoBroker(db)
+    raise ValueError(f"Unknown event broker: {kind}")
@@ -0,0 +1,108 @@
+import asyncio
+import heapq
+import os
+from bson import ObjectId
+from datetime import datetime, timedelta
+
+EXPIRY_SWEEP_SECONDS = float(os.getenv("EXPIRY_SWEEP_SECONDS", "60"))
+
+
+class ExpiryScheduler:
+    """Flips open games to "expired" as their expires_at deadlines pass.
+
+    Deadlines are kept in a min-heap so the task sleeps until the next one is
+    due. Games created by other workers are picked up by a periodic sweep
+    that expires anything overdue and loads deadlines due before the next
+    sweep, so each worker only holds a short horizon in memory.
+    """
+
+    def __init__(self, sweep_interval=EXPIRY_SWEEP_SECONDS):
+        self.sweep_interval = sweep_interval
+        self.collection = None
+        self.expired_count = 0
+        self._heap = []
+        self._scheduled = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, game_id, expires_at):
+        game_id = str(game_id)
+        if game_id in self._scheduled:
+            return
+        self._scheduled.add(game_id)
+        heapq.heappush(self._heap, (expires_at, game_id))
+        if self._heap[0][1] == game_id:
+            # New earliest deadline, re-arm the timer
+            self._wakeup.set()
+
+    async def start(self, collection):
+        self.collection = collection
+        await self._sweep(datetime.utcnow())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep(self, now):
+        result = await self.collection.update_many(
+            {"status": "open", "expires_at": {"$lte": now}},
+            {"$set": {"status": "expired"}}
+        )
+        self.expired_count += result.modified_count
+
+        horizon = now + timedelta(seconds=self.sweep_interval)
+        upcoming = self.collection.find(
+            {"status": "open", "expires_at": {"$lte": horizon}},
+            {"expires_at": 1}
+        )
+        async for game in upcoming:
+            self.schedule(game["_id"], game["expires_at"])
+
+    async def _expire_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, game_id = heapq.heappop(self._heap)
+            self._scheduled.discard(game_id)
+            due.append(ObjectId(game_id))
+        if due:
+            # Conditional so games joined or deleted in the meantime are left alone
+            result = await self.collection.update_many(
+                {"_id": {"$in": due}, "status": "open", "expires_at": {"$lte": now}},
+                {"$set": {"status": "expired"}}
+            )
+            self.expired_count += result.modified_count
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time() + self.sweep_interval
+        while True:
+            try:
+                now = datetime.utcnow()
+                await self._expire_due(now)
+                if loop.time() >= next_sweep:
+                    await self._sweep(now)
+                    next_sweep = loop.time() + self.sweep_interval
+
+                timeout = next_sweep - loop.time()
+                if self._heap:
+                    until_next = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                    timeout = min(timeout, until_next)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error expiring games: {str(e)}")
+                await asyncio.sleep(1)
@@ -8,17 +8,53 @@ const api = axios.create({
     }
 });
 
-// Function to set the token
-const setToken = (token) => {
+// Function to set the token (and, after login or refresh, the refresh token)
+const setToken = (token, refreshToken) => {
     if (token) {
         localStorage.setItem('token', token);
         api.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+        if (refreshToken) {
+            localStorage.setItem('refreshToken', refreshToken);
+        }
     } else {
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         delete api.defaults.headers.common['Authorization'];
     }
 };
 
+// Trade the refresh token for a new pair; concurrent 401s share one call,
+// since each refresh token can only be used once
+let refreshing = null;
+const refreshSession = () => {
+    if (!refreshing) {
+        const refreshToken = localStorage.getItem('refreshToken');
+        refreshing = (refreshToken
+            ? api.post('/token/refresh', { refresh_token: refreshToken })
+            : Promise.reject(new Error('No refresh token'))
+        ).then((response) => {
+            setToken(response.data.access_token, response.data.refresh_token);
+            return response.data.access_token;
+        }).finally(() => {
+            refreshing = null;
+        });
+    }
+    return refreshing;
+};
+
+// End the session on the server; the tokens are cleared either way
+const revokeSession = async () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    setToken(null);
+    if (refreshToken) {
+        try {
+            await api.post('/token/revoke', { refresh_token: refreshToken });
+        } catch (error) {
+            console.error('Logout failed:', error);
+        }
+    }
+};
+
 // Add a request interceptor to include the token in requests
 api.interceptors.request.use(
     (config) => {
@@ -37,17 +73,32 @@ api.interceptors.request.use(
     }
 );
 
-// Add a response interceptor to handle authentication errors
+// Add a response interceptor to handle authentication errors: refresh the
+// access token once and retry, logging out if that fails
 api.interceptors.response.use(
     (response) => response,
-    (error) => {
+    async (error) => {
+        const config = error.config;
         if (error.response?.status === 401) {
-            setToken(null);
+            if (config && !config._retried && !config.url.startsWith('/token')) {
+                config._retried = true;
+                try {
+                    const token = await refreshSession();
+                    config.headers.Authorization = `Bearer ${token}`;
+                    return api(config);
+                } catch (refreshError) {
+                    setToken(null);
+                    return Promise.reject(error);
+                }
+            }
+            if (!config?.url.startsWith('/token')) {
+                setToken(null);
+            }
         }
         return Promise.reject(error);
     }
 );
 
-// Export the Axios instance and setToken function
-export { setToken };
+// Export the Axios instance and token helpers
+export { setToken, revokeSession };
 export default api; 
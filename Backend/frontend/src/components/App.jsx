@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import Login from './Login';
 import UserList from './Users';
-import api, { setToken } from '../api.js';
+import api, { setToken, revokeSession } from '../api.js';
 import '../style.css';
 
 const App = () => {
@@ -36,13 +36,13 @@ const App = () => {
     checkAuth();
   }, []);
 
-  const handleLogin = async (token) => {
-    setToken(token);
+  const handleLogin = async (token, refreshToken) => {
+    setToken(token, refreshToken);
     await checkAuth();
   };
 
   const handleLogout = () => {
-    setToken(null);
+    revokeSession();
     setIsAuthenticated(false);
     setCurrentUser(null);
     setActiveView('home');
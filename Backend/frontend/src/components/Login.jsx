@@ -23,7 +23,7 @@ const Login = ({ onLogin }) => {
         
         const response = await api.post('/token', loginFormData);
         if (response.data.access_token) {
-          onLogin(response.data.access_token);
+          onLogin(response.data.access_token, response.data.refresh_token);
         } else {
           setError('Invalid login response');
         }
@@ -43,7 +43,7 @@ const Login = ({ onLogin }) => {
           
           const loginResponse = await api.post('/token', loginFormData);
           if (loginResponse.data.access_token) {
-            onLogin(loginResponse.data.access_token);
+            onLogin(loginResponse.data.access_token, loginResponse.data.refresh_token);
           }
         }
       }
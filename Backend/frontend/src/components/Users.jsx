@@ -1,7 +1,26 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import api from "../api.js";
 import './Users.css';
 
+// Event types sent by GET /games/events
+const GAME_EVENT_TYPES = [
+  'game_created', 'game_matched', 'game_joined', 'game_ready',
+  'player_ready', 'game_completed', 'game_deleted'
+];
+
+// Map the frontend format values to what the backend expects
+const FORMAT_MAP = {
+  'ffa': '1v1',  // Map FFA to 1v1 since that's what the server expects
+  '4v4': '4v4',
+  '5v5': '5v5'
+};
+
+// Open games fetched per page of the listing
+const GAMES_PAGE_SIZE = 50;
+
+// The server sends UTC times without an offset
+const parseServerTime = (value) => new Date(/(Z|[+-]\d\d:\d\d)$/.test(value) ? value : `${value}Z`);
+
 const UserList = ({ activeTab }) => {
   const [parties, setParties] = useState([]);
   const [newPartyName, setNewPartyName] = useState('');
@@ -23,6 +42,9 @@ const UserList = ({ activeTab }) => {
   const [allGames, setAllGames] = useState([]);
   const [gameFormat, setGameFormat] = useState('');
   const [hasCreatedGame, setHasCreatedGame] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  // Offset of the last game event applied, for resuming the stream
+  const lastEventOffset = useRef(null);
 
   const fetchCurrentUser = async () => {
     try {
@@ -37,7 +59,7 @@ const UserList = ({ activeTab }) => {
 
   const fetchParties = async (userId) => {
     try {
-      const response = await api.get(`/parties/${userId}`);
+      const response = await api.get(`/parties/${userId}`, { params: { expand: 'members' } });
       setParties(response.data.parties);
       setError('');
     } catch (error) {
@@ -61,37 +83,37 @@ const UserList = ({ activeTab }) => {
     }
   };
 
+  // One page of open games; older pages are loaded when the user asks
+  const fetchOpenGames = async (cursor = null) => {
+    const response = await api.get('/games', {
+      params: { open_only: true, limit: GAMES_PAGE_SIZE, cursor: cursor || undefined }
+    });
+    return response.data;
+  };
+
   const fetchGames = async (partyId) => {
     try {
-      let response;
       if (partyId) {
-        response = await api.get(`/games/party/${partyId}`);
+        const response = await api.get(`/games/party/${partyId}`);
+        setGames(response.data);
       } else {
-        response = await api.get('/games');
+        const page = await fetchOpenGames();
+        setGames(page.games);
+        setNextCursor(page.next_cursor);
       }
-      setGames(response.data);
     } catch (error) {
       console.error('Error fetching games:', error);
       setError(error.response?.data?.detail || 'Failed to fetch games');
     }
   };
 
-  const fetchPartyMembers = async (party) => {
-    try {
-      const response = await api.get('/users');
-      const users = response.data.users;
-      const memberDetails = {};
-      party.members.forEach(memberId => {
-        const user = users.find(u => u.id === memberId);
-        if (user) {
-          memberDetails[memberId] = user.name;
-        }
-      });
-      setPartyMembers(memberDetails);
-    } catch (error) {
-      console.error('Error fetching party members:', error);
-      setError(error.response?.data?.detail || 'Failed to fetch party members');
-    }
+  const fetchPartyMembers = (party) => {
+    // Parties are fetched with expand=members, so names come with them
+    const memberDetails = {};
+    (party.member_profiles || []).forEach(member => {
+      memberDetails[member.id] = member.name;
+    });
+    setPartyMembers(memberDetails);
   };
 
   const handleCreateParty = async (e) => {
@@ -119,8 +141,8 @@ const UserList = ({ activeTab }) => {
 
     try {
       // First, find the user by username
-      const response = await api.get('/users');
-      const users = response.data.users;
+      const response = await api.get('/users/search', { params: { q: inviteUsername.trim() } });
+      const users = response.data;
       const invitedUser = users.find(user => user.name === inviteUsername.trim());
 
       if (!invitedUser) {
@@ -153,7 +175,7 @@ const UserList = ({ activeTab }) => {
 
       // If accepted, update parties list
       if (status === 'accepted') {
-        const partiesResponse = await api.get(`/parties/${currentUser.id}`);
+        const partiesResponse = await api.get(`/parties/${currentUser.id}`, { params: { expand: 'members' } });
         setParties(partiesResponse.data.parties);
       }
 
@@ -205,16 +227,9 @@ const UserList = ({ activeTab }) => {
     }
 
     try {
-      // Map the frontend format values to what the backend expects
-      const formatMap = {
-        'ffa': '1v1',  // Map FFA to 1v1 since that's what the server expects
-        '4v4': '4v4',
-        '5v5': '5v5'
-      };
-
       // Base game data without party_id
       const gameData = {
-        format: formatMap[gameFormat] || gameFormat,
+        format: FORMAT_MAP[gameFormat] || gameFormat,
         game_type: 'deathmatch'
       };
 
@@ -386,15 +401,33 @@ const UserList = ({ activeTab }) => {
 
   const fetchAllGames = async () => {
     try {
-      const response = await api.get('/games');
-      setGames(response.data);
-      setAllGames(response.data);
+      const page = await fetchOpenGames();
+      setGames(page.games);
+      setAllGames(page.games);
+      setNextCursor(page.next_cursor);
     } catch (error) {
       console.error('Error fetching all games:', error);
       setError(error.response?.data?.detail || 'Failed to fetch games');
     }
   };
 
+  const loadMoreGames = async () => {
+    try {
+      const page = await fetchOpenGames(nextCursor);
+      // The stream may already have added some of these
+      const append = (list) => [
+        ...list,
+        ...page.games.filter(game => !list.some(listed => listed.id === game.id))
+      ];
+      setGames(append);
+      setAllGames(append);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading more games:', error);
+      setError(error.response?.data?.detail || 'Failed to load more games');
+    }
+  };
+
   // Add this helper function to filter valid parties based on game format
   const getValidParties = (format) => {
     if (!format || format === 'ffa') return [];
@@ -419,25 +452,122 @@ const UserList = ({ activeTab }) => {
 
   useEffect(() => {
     if (currentUser) {
+      // Game tabs are loaded by the event stream effect below
       if (activeTab === 'parties') {
         fetchParties(currentUser.id);
-      } else if (activeTab === 'games' || activeTab === 'create-game') {
-        fetchAllGames();
       }
     }
   }, [currentUser, activeTab]);
 
+  // Each event carries the game as it is now, so it is applied in place.
+  // The lists hold open games and games the current user plays in.
+  const applyGameEvent = (type, data) => {
+    const update = (list) => {
+      const listed = type !== 'game_deleted' && data.game && (
+        data.game.status === 'open' || data.game.players.includes(currentUser?.id)
+      );
+      if (!listed) {
+        return list.filter(game => game.id !== data.game_id);
+      }
+      if (list.some(game => game.id === data.game_id)) {
+        return list.map(game => (game.id === data.game_id ? data.game : game));
+      }
+      return [data.game, ...list];
+    };
+    setGames(update);
+    setAllGames(update);
+  };
+
+  const expireGames = () => {
+    const now = Date.now();
+    const expire = (list) => list.filter(game => (
+      game.status !== 'open' || parseServerTime(game.expires_at).getTime() > now
+    ));
+    setGames(expire);
+    setAllGames(expire);
+  };
+
+  const streamFormat = activeTab === 'create-game' && gameFormat ? FORMAT_MAP[gameFormat] : null;
+
+  // Keep the game lists current from GET /games/events. The list is only
+  // fetched when the stream first opens or the server reports a gap
+  // ("reset"); otherwise events are applied locally, and a reconnect passes
+  // the last offset so the server replays what was missed. EventSource
+  // cannot send the Authorization header, so each connection uses a
+  // short-lived ticket. Expiry is not pushed, so open games past expires_at
+  // are dropped on a local timer.
   useEffect(() => {
-    let interval;
-    if (activeTab === 'games' || activeTab === 'create-game') {
-      interval = setInterval(fetchAllGames, 5000);
+    if (!currentUser || (activeTab !== 'games' && activeTab !== 'create-game')) {
+      return undefined;
     }
+    let source = null;
+    let stopped = false;
+    let reconnectTimer = null;
+    let loaded = false;
+    lastEventOffset.current = null;
+    const expiryTimer = setInterval(expireGames, 30000);
+
+    const onGameEvent = (event) => {
+      const data = JSON.parse(event.data);
+      lastEventOffset.current = data.offset;
+      applyGameEvent(event.type, data);
+    };
+
+    const reconnect = (delay) => {
+      if (source) {
+        source.close();
+        source = null;
+      }
+      if (!stopped) {
+        reconnectTimer = setTimeout(connect, delay);
+      }
+    };
+
+    const connect = async () => {
+      try {
+        const response = await api.post('/games/events/ticket');
+        if (stopped) {
+          return;
+        }
+        const params = new URLSearchParams({ ticket: response.data.ticket });
+        if (streamFormat) {
+          params.set('format', streamFormat);
+        }
+        if (lastEventOffset.current !== null) {
+          params.set('since', lastEventOffset.current);
+        }
+        source = new EventSource(`${api.defaults.baseURL}/games/events?${params}`);
+        source.onopen = () => {
+          if (lastEventOffset.current === null) {
+            loaded = true;
+            fetchAllGames();
+          }
+        };
+        GAME_EVENT_TYPES.forEach((type) => source.addEventListener(type, onGameEvent));
+        source.addEventListener('reset', fetchAllGames);
+        // Reconnect ourselves so the new connection gets a fresh ticket
+        source.onerror = () => reconnect(1000);
+      } catch (error) {
+        console.error('Error opening game event stream:', error);
+        // Show something while the stream is unavailable, but do not poll
+        if (!loaded) {
+          loaded = true;
+          fetchAllGames();
+        }
+        reconnect(5000);
+      }
+    };
+
+    connect();
     return () => {
-      if (interval) {
-        clearInterval(interval);
+      stopped = true;
+      clearInterval(expiryTimer);
+      clearTimeout(reconnectTimer);
+      if (source) {
+        source.close();
       }
     };
-  }, [activeTab]);
+  }, [currentUser?.id, activeTab, streamFormat]);
 
   if (!localStorage.getItem('token')) {
     return (
@@ -761,6 +891,11 @@ const UserList = ({ activeTab }) => {
               ) : (
                 <p className="no-games">No active games for this format</p>
               )}
+              {nextCursor && (
+                <button type="button" className="load-more-button" onClick={loadMoreGames}>
+                  Load more
+                </button>
+              )}
             </div>
           )}
         </div>
@@ -888,6 +1023,11 @@ const UserList = ({ activeTab }) => {
             ) : (
               <p className="no-games">No active games</p>
             )}
+            {nextCursor && (
+              <button type="button" className="load-more-button" onClick={loadMoreGames}>
+                Load more
+              </button>
+            )}
           </div>
         </div>
       ) : null}
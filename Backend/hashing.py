@@ -0,0 +1,81 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from passlib.context import CryptContext
+
+# bcrypt is deliberately slow, so every hash/verify runs on a bounded pool
+# instead of the event loop. The pyca bcrypt backend releases the GIL, so a
+# thread pool is the default; a process pool can be selected for backends
+# that do not.
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HashingOverloaded(Exception):
+    pass
+
+
+# Module level so they can be pickled into a process pool
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, kind=HASH_POOL_KIND, max_workers=HASH_POOL_SIZE, max_queue=HASH_POOL_MAX_QUEUE):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hash pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._in_flight = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self):
+        # Jobs waiting for a free worker
+        return max(0, self._in_flight - self.max_workers)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def start(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="bcrypt"
+                )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HashingOverloaded("Password hashing queue is full")
+        self.start()
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password):
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password, hashed_password):
+        return await self._run(_verify, plain_password, hashed_password)
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Every index the application relies on, by collection. create_indexes is a
+# no-op for indexes that already exist with the same spec, so this is safe to
+# apply on every startup.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+    ],
+    "parties": [
+        IndexModel([("members", ASCENDING)], name="members"),
+        # Largest party a user leads; also serves plain creator_id lookups
+        IndexModel([("creator_id", ASCENDING), ("member_count", DESCENDING)], name="creator_member_count"),
+    ],
+    "invitations": [
+        IndexModel(
+            [("party_id", ASCENDING), ("invitee_id", ASCENDING), ("status", ASCENDING)],
+            name="party_invitee_status"
+        ),
+        IndexModel([("invitee_id", ASCENDING), ("status", ASCENDING)], name="invitee_status"),
+    ],
+    "games": [
+        IndexModel([("creator_id", ASCENDING), ("status", ASCENDING)], name="creator_status"),
+        # Whether a user plays in an active game
+        IndexModel([("players", ASCENDING), ("status", ASCENDING)], name="players_status"),
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+        IndexModel([("party_id", ASCENDING)], name="party_id"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        # GET /games filters: equality first, then the (created_at, _id) sort
+        IndexModel(
+            [("status", ASCENDING), ("format", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="status_format_created_at_id"
+        ),
+        IndexModel(
+            [("format", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="format_created_at_id"
+        ),
+        # Results whose rating update failed, for the retry loop
+        IndexModel(
+            [("ratings_retry_at", ASCENDING)],
+            name="ratings_retry_at_pending",
+            partialFilterExpression={"ratings_pending": True}
+        ),
+    ],
+    # Finished games moved out of "games" by the archiver
+    "games_archive": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("party_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="party_created_at_id"
+        ),
+    ],
+    "ratings": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    # Documents are removed by the TTL monitor once expires_at passes
+    "refresh_tokens": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("session_id", ASCENDING)], name="session_id"),
+    ],
+    "revoked_sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Each worker's poll for revocations made elsewhere
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+    ],
+    # Only used with EVENT_BROKER=mongo; events are only needed for resumes
+    "game_events": [
+        IndexModel([("offset", ASCENDING)], name="offset", unique=True),
+        IndexModel([("published_at", ASCENDING)], name="published_at_ttl", expireAfterSeconds=3600),
+    ],
+}
+
+# The filters main.py issues, as (collection, fields, where). Used by the
+# check mode to flag query shapes that would fall back to a collection scan.
+QUERY_SHAPES = [
+    ("users", ("email",), "signup, login, get_current_user"),
+    ("users", ("search_terms",), "search_users, search terms backfill"),
+    ("parties", ("members",), "get_user_parties"),
+    ("parties", ("creator_id", "member_count"), "join_game"),
+    ("invitations", ("party_id", "invitee_id", "status"), "invite_to_party"),
+    ("invitations", ("invitee_id", "status"), "get_received_invitations"),
+    ("invitations", ("party_id",), "delete_party"),
+    ("games", ("players", "status"), "has_active_game"),
+    ("games", ("status", "expires_at"), "expiry sweep, archiver"),
+    ("games", ("party_id",), "get_party_games"),
+    ("games", ("created_at", "_id"), "get_all_games pagination"),
+    ("games", ("status", "format", "created_at", "_id"), "get_all_games status and format filters"),
+    ("games", ("format", "created_at", "_id"), "get_all_games format filter"),
+    ("games", ("ratings_retry_at",), "retry_pending_ratings"),
+    ("games_archive", ("created_at", "_id"), "get_game_history"),
+    ("games_archive", ("party_id", "created_at", "_id"), "get_game_history by party"),
+    ("ratings", ("updated_at",), "leaderboard refresh"),
+    ("refresh_tokens", ("session_id",), "refresh token reuse, logout"),
+    ("revoked_sessions", ("revoked_at",), "RevocationSet polling"),
+    ("game_events", ("offset",), "MongoBroker polling"),
+]
+
+
+async def ensure_indexes(db):
+    for collection_name, models in INDEXES.items():
+        # One at a time, so a failed build does not skip the rest
+        for model in models:
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # Keep serving without the index rather than refusing to start,
+                # e.g. when existing duplicates block a unique index build
+                print(f"Failed to create index {model.document['name']} on {collection_name}: {str(e)}")
+
+
+def _supports(index_keys, fields):
+    # An index serves a filter when the filter pins down a leading prefix of
+    # its keys; report how many of the filter's fields that prefix covers.
+    covered = 0
+    for key in index_keys:
+        if key not in fields:
+            break
+        covered += 1
+    return covered
+
+
+async def check_query_shapes(db):
+    """Return the query shapes that no existing index fully supports."""
+    existing = {}
+    for collection_name in {shape[0] for shape in QUERY_SHAPES}:
+        info = await db[collection_name].index_information()
+        existing[collection_name] = [
+            [key for key, _ in spec["key"]] for spec in info.values()
+        ]
+
+    problems = []
+    for collection_name, fields, where in QUERY_SHAPES:
+        best = max(
+            (_supports(keys, fields) for keys in existing[collection_name]),
+            default=0
+        )
+        if best == 0:
+            problems.append((collection_name, fields, where, "collection scan"))
+        elif best < len(fields):
+            problems.append((collection_name, fields, where, "partially indexed"))
+    return problems
+
+
+async def _main(argv):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ["MONGODB_URL"])
+    db = client.userdb
+    try:
+        if "--apply" in argv:
+            await ensure_indexes(db)
+        problems = await check_query_shapes(db)
+    finally:
+        client.close()
+
+    for collection_name, fields, where, problem in problems:
+        print(f"{collection_name} {{{', '.join(fields)}}} ({where}): {problem}")
+    if not problems:
+        print("All query shapes are supported by an index")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    # python indexes.py [--apply]  -- reports unsupported query shapes
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,109 @@
+import hashlib
+import itertools
+import os
+import uuid
+from datetime import datetime
+from cache import TTLCache
+
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "256"))
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "30"))
+
+
+class ListingEntry:
+    """A serialized game listing shared by every viewer.
+
+    Each game is stored as JSON twice, with and without the creator name
+    masked, so rendering for a viewer is just picking fragments: only the
+    creator of an open game sees their own name.
+    """
+
+    __slots__ = ("tag", "version", "valid_until", "prefix", "suffix", "fragments", "open_creators")
+
+    def __init__(self, tag, version, valid_until, prefix, suffix, fragments):
+        self.tag = tag
+        self.version = version
+        self.valid_until = valid_until
+        self.prefix = prefix
+        self.suffix = suffix
+        # (masked, unmasked, creator_id) with creator_id None when masking
+        # does not apply to the game
+        self.fragments = fragments
+        self.open_creators = {creator_id for _, _, creator_id in fragments if creator_id is not None}
+
+    def etag(self, viewer_id):
+        if viewer_id in self.open_creators:
+            variant = hashlib.blake2b(viewer_id.encode(), digest_size=6).hexdigest()
+        else:
+            variant = "public"
+        return f'W/"{self.tag}-{variant}"'
+
+    def render(self, viewer_id):
+        return self.prefix + b",".join(
+            unmasked if creator_id == viewer_id else masked
+            for masked, unmasked, creator_id in self.fragments
+        ) + self.suffix
+
+
+class ListingCache:
+    """Serialized listings keyed by query, valid for one listing version.
+
+    The version is bumped by every game mutation, and an entry also lapses
+    when the first open game on it reaches expires_at (its status changes
+    at read time) or after the TTL.
+    """
+
+    def __init__(self, maxsize=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Tags must never repeat across restarts or workers, or a client could
+        # get a 304 for a body it has not seen
+        self._tag_prefix = uuid.uuid4().hex[:8]
+        self._tags = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        entry = self._entries.get(key, count=False)
+        if entry is not None and (
+            entry.version != version
+            or (entry.valid_until is not None and datetime.utcnow() >= entry.valid_until)
+        ):
+            self._entries.invalidate(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, version, valid_until, prefix, suffix, fragments):
+        entry = ListingEntry(f"{self._tag_prefix}.{next(self._tags)}", version, valid_until, prefix, suffix, fragments)
+        self._entries.set(key, entry)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    weak = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == weak:
+            return True
+    return False
@@ -0,0 +1,80 @@
+import asyncio
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class UserLoader:
+    """Resolves user ids to public profiles with one $in query per batch.
+
+    Ids requested during the same event-loop tick are fetched together.
+    Results are memoized for the lifetime of the loader (one request) and,
+    when a shared cache is given, across requests until its TTL runs out.
+    Unknown ids resolve to None.
+    """
+
+    def __init__(self, collection, shared_cache=None):
+        self.collection = collection
+        self.shared_cache = shared_cache
+        self.queries = 0
+        self._memo = {}
+        self._batch = []
+        self._scheduled = False
+        self._tasks = set()
+
+    async def load(self, user_id):
+        return await self._future_for(user_id)
+
+    async def load_many(self, user_ids):
+        return await asyncio.gather(*(self._future_for(user_id) for user_id in user_ids))
+
+    def _future_for(self, user_id):
+        future = self._memo.get(user_id)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._memo[user_id] = future
+        cached = self.shared_cache.get(user_id) if self.shared_cache is not None else None
+        if cached is not None:
+            future.set_result(cached)
+            return future
+
+        self._batch.append(user_id)
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch_batch)
+        return future
+
+    def _dispatch_batch(self):
+        batch, self._batch = self._batch, []
+        self._scheduled = False
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch):
+        try:
+            object_ids = []
+            for user_id in batch:
+                try:
+                    object_ids.append(ObjectId(user_id))
+                except (InvalidId, TypeError):
+                    pass
+
+            found = {}
+            if object_ids:
+                self.queries += 1
+                async for user in self.collection.find({"_id": {"$in": object_ids}}, {"name": 1}):
+                    found[str(user["_id"])] = {"id": str(user["_id"]), "name": user["name"]}
+
+            for user_id in batch:
+                profile = found.get(user_id)
+                if profile is not None and self.shared_cache is not None:
+                    self.shared_cache.set(user_id, profile)
+                self._memo[user_id].set_result(profile)
+        except Exception as e:
+            for user_id in batch:
+                future = self._memo.pop(user_id)
+                if not future.done():
+                    future.set_exception(e)
@@ -1,18 +1,48 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Header
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from typing import List, Literal, Optional
 from enum import Enum
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
 import asyncio
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
+import base64
+import hmac
+import signal
+import threading
+import time
+import json
+from datetime import datetime, timedelta, timezone
 from jwt import encode, decode, PyJWTError
+from hashing import PasswordHasher, HashingOverloaded
+from cache import TTLCache
+from indexes import ensure_indexes, check_query_shapes
+from expiry import ExpiryScheduler
+from archive import GameArchiver
+from events import EVENT_BROKER, GameEventHub, RESET, CLOSED, create_broker
+from loaders import UserLoader
+from matchmaking import MatchmakingEngine
+from ratings import RATING_RETRY_LEASE_SECONDS, RatingService
+from listing_cache import ListingCache, etag_matches
+from singleflight import SingleFlight
+from party_cache import PartyCache, backfill_member_counts
+from sessions import RefreshTokenStore, RevocationSet
+from search import search_terms, prefix_query, normalize, backfill_search_terms
+import metrics
+from metrics import METRICS_ENABLED, ConnectionPoolStats, MetricsMiddleware, MongoCommandMetrics
+from profiling import DEBUG_TOKEN, ProfilerSettings, ProfilingMiddleware, TraceCommandListener, stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Load environment variables
 load_dotenv()
@@ -21,9 +51,46 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Lifetime of the query-string tickets EventSource connects with; only
+# checked when a stream is opened
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "60"))
+
+# Authenticated principals, keyed by token subject (email)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+# Public user profiles for expand=members/players; a TTL of 0 disables it
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "50000"))
+USER_PROFILE_CACHE_TTL = float(os.getenv("USER_PROFILE_CACHE_TTL", "30"))
+
+# Hot typeahead prefixes for /users/search; cleared on every signup
+USER_SEARCH_CACHE_SIZE = int(os.getenv("USER_SEARCH_CACHE_SIZE", "1024"))
+USER_SEARCH_CACHE_TTL = float(os.getenv("USER_SEARCH_CACHE_TTL", "10"))
+
+password_hasher = PasswordHasher()
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+user_profile_cache = (
+    TTLCache(maxsize=USER_PROFILE_CACHE_SIZE, ttl=USER_PROFILE_CACHE_TTL)
+    if USER_PROFILE_CACHE_TTL > 0 else None
+)
+user_search_cache = TTLCache(maxsize=USER_SEARCH_CACHE_SIZE, ttl=USER_SEARCH_CACHE_TTL)
+expiry_scheduler = ExpiryScheduler()
+event_hub = GameEventHub()
+# Archived games drop out of the listings, so cached ones must be rebuilt
+game_archiver = GameArchiver(on_archived=lambda count: event_hub.touch())
+matchmaking_engine = MatchmakingEngine()
+rating_service = RatingService()
+listing_cache = ListingCache()
+# Concurrent identical reads share one database round trip
+listing_flights = SingleFlight()
+party_flights = SingleFlight()
+party_cache = PartyCache()
+# Revoked sessions, shared between workers; their access tokens are refused
+# until they would have expired anyway
+revoked_sessions = RevocationSet(ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+refresh_tokens = RefreshTokenStore(revoked_sessions)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -42,12 +109,25 @@ class User(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
 
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class UserSummary(BaseModel):
+    id: str
+    name: str
+
 class Users(BaseModel):
     users: List[User]
+    next_cursor: Optional[str] = None
 
 class PartyCreate(BaseModel):
     name: str
@@ -57,6 +137,7 @@ class Party(BaseModel):
     name: str
     creator_id: str
     members: List[str]
+    member_profiles: Optional[List[UserSummary]] = None  # only with expand=members
 
 class PartyInvite(BaseModel):
     party_id: str
@@ -80,6 +161,17 @@ class PartyInvitationResponse(BaseModel):
     invitation_id: str
     status: str
 
+class PartyBulkInvitationCreate(BaseModel):
+    invitee_ids: List[str]
+
+class PartyBulkInvitationResult(BaseModel):
+    invitee_id: str
+    status: str  # "pending", "already_member", "already_invited"
+    invitation_id: Optional[str] = None
+
+class PartyBulkInvitationResponse(BaseModel):
+    results: List[PartyBulkInvitationResult]
+
 class InvitationResponse(BaseModel):
     status: str
 
@@ -93,6 +185,20 @@ class GameType(str, Enum):
     BEST_OF_THREE = "best_of_3"
     DEATHMATCH = "deathmatch"  # For 1v1 only
 
+# Minimum party size for team formats
+TEAM_FORMAT_SIZES = {
+    GameFormat.FIVE_V_FIVE: 5,
+    GameFormat.FOUR_V_FOUR: 4
+}
+
+MAX_PLAYERS = {
+    GameFormat.FIVE_V_FIVE: 10,
+    GameFormat.FOUR_V_FOUR: 8,
+    GameFormat.ONE_V_ONE: 2
+}
+
+GAME_LISTING_MINUTES = 30
+
 class GamePost(BaseModel):
     id: str
     party_id: Optional[str] = None
@@ -107,27 +213,41 @@ class GamePost(BaseModel):
     players: List[str] = []
     max_players: int
     match_result: Optional[dict] = None
+    player_profiles: Optional[List[UserSummary]] = None  # only with expand=players
 
-    class Config:
-        extra = "forbid"
-        validate_assignment = True
-        allow_population_by_field_name = True
-        json_encoders = {
-            ObjectId: str
-        }
+    model_config = ConfigDict(extra="forbid", validate_assignment=True, populate_by_name=True)
+
+class GamePage(BaseModel):
+    games: List[GamePost]
+    next_cursor: Optional[str] = None
 
 class GamePostCreate(BaseModel):
     party_id: Optional[str] = None
     format: GameFormat
     game_type: GameType
 
-    class Config:
-        extra = "forbid"  # Prevent extra fields
-        validate_assignment = True  # Validate during assignment
-        allow_population_by_field_name = True  # Allow population by field name
-        json_encoders = {
-            ObjectId: str  # Convert ObjectId to string
-        }
+    model_config = ConfigDict(extra="forbid", validate_assignment=True, populate_by_name=True)
+
+class MatchmakingStatus(BaseModel):
+    status: str  # "idle", "queued", "matched"
+    ticket_id: Optional[str] = None
+    format: Optional[GameFormat] = None
+    game_type: Optional[GameType] = None
+    queued_at: Optional[datetime] = None
+    game_id: Optional[str] = None
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    subject_id: str
+    name: Optional[str] = None
+    rating: float
+    games: int
+    wins: int
+    losses: int
+
+class LeaderboardPage(BaseModel):
+    entries: List[LeaderboardEntry]
+    total: int
 
 class MatchResult(BaseModel):
     winner_id: str
@@ -143,27 +263,296 @@ MONGODB_URL = os.getenv("MONGODB_URL")
 if not MONGODB_URL:
     raise ValueError("No MONGODB_URL found in environment variables")
 
+# Connection pool and timeouts for each worker's client; every worker opens
+# its own pool, so the server may hold up to WEB_CONCURRENCY * MONGO_MAX_POOL_SIZE
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_TIMEOUT_MS = os.getenv("MONGO_TIMEOUT_MS")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+
+# Serving
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8001"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "20"))
+
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1") == "1"
+
+# Serialize listings straight from the stored documents instead of
+# validating every game through GamePost first
+TRUSTED_SERIALIZATION = os.getenv("TRUSTED_SERIALIZATION", "1") == "1"
+INDEX_CHECK = os.getenv("INDEX_CHECK", "0") == "1"
+
 client = None
 db = None
 collection = None
 party_collection = None
 invitation_collection = None
 game_collection = None
+archive_collection = None
+pool_stats = ConnectionPoolStats()
+# Set once the worker starts shutting down; /ready then reports 503
+draining = False
+
+def mongo_client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_TIMEOUT_MS:
+        options["timeoutMS"] = int(MONGO_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+def begin_drain():
+    # Open event streams would otherwise hold the worker until the shutdown
+    # timeout; closing them makes clients reconnect to another worker
+    global draining
+    if not draining:
+        draining = True
+        event_hub.close_subscriptions()
+
+def install_drain_handlers():
+    # uvicorn has installed its exit handlers by the time startup runs. Chain
+    # ours in front so draining starts as soon as the signal arrives, before
+    # uvicorn waits for open connections to finish.
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(signum)
+        if not callable(previous):
+            continue
+
+        def handler(received, frame, previous=previous):
+            loop.call_soon_threadsafe(begin_drain)
+            previous(received, frame)
+
+        signal.signal(signum, handler)
+
+hashing_overloaded_exception = HTTPException(
+    status_code=503,
+    detail="Server is busy, please try again shortly",
+    headers={"Retry-After": "1"},
+)
+
+async def verify_password(plain_password, hashed_password):
+    try:
+        with stage("bcrypt"):
+            return await password_hasher.verify(plain_password, hashed_password)
+    except HashingOverloaded:
+        raise hashing_overloaded_exception
+
+async def get_password_hash(password):
+    try:
+        with stage("bcrypt"):
+            return await password_hasher.hash(password)
+    except HashingOverloaded:
+        raise hashing_overloaded_exception
+
+# Only fetch the fields the response models expose
+USER_PROJECTION = {"email": 1, "name": 1}
+GAME_PROJECTION = {
+    field: 1 for field in GamePost.model_fields
+    if field not in ("id", "player_profiles")
+}
+
+MAX_BULK_INVITES = 20
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(values: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def games_after_cursor(cursor: str, newest_first: bool = True) -> dict:
+    # Keyset pagination on (created_at, _id)
+    position = decode_cursor(cursor)
+    try:
+        last_created_at = datetime.fromisoformat(position["c"])
+        last_id = ObjectId(position["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    after = "$lt" if newest_first else "$gt"
+    return {"$or": [
+        {"created_at": {after: last_created_at}},
+        {"created_at": last_created_at, "_id": {after: last_id}}
+    ]}
+
+async def fetch_game_page(games, query: dict, limit: int, newest_first: bool = True):
+    # Fetch one extra document to know whether another page exists
+    direction = -1 if newest_first else 1
+    page = await games.find(query, GAME_PROJECTION).sort(
+        [("created_at", direction), ("_id", direction)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor({
+            "c": page[-1]["created_at"].isoformat(),
+            "i": str(page[-1]["_id"])
+        })
+    return page, next_cursor
+
+def game_status(game: dict, now: datetime) -> str:
+    # Open games past their deadline read as expired even if the expiry
+    # scheduler has not flipped them yet
+    status = game["status"]
+    if status == "open" and game["expires_at"] < now:
+        status = "expired"
+    return status
+
+def game_post_from_doc(game: dict, current_user: Optional[User] = None, now: Optional[datetime] = None) -> GamePost:
+    status = game_status(game, now or datetime.utcnow())
+
+    # Hide creator info if game is open and user is not the creator
+    creator_name = game["creator_name"]
+    if status == "open" and current_user is not None and game["creator_id"] != current_user.id:
+        creator_name = "Anonymous"
+
+    return GamePost(
+        id=str(game["_id"]),
+        party_id=game["party_id"],
+        party_name=game["party_name"],
+        creator_id=game["creator_id"],
+        creator_name=creator_name,
+        format=game["format"],
+        game_type=game["game_type"],
+        status=status,
+        created_at=game["created_at"],
+        expires_at=game["expires_at"],
+        players=game["players"],
+        max_players=game["max_players"],
+        match_result=game.get("match_result")
+    )
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def json_value(value):
+    # Datetimes formatted the way pydantic does in mode="json"
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, dict):
+        return {key: json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def game_json_from_doc(game: dict, now: datetime, player_profiles: Optional[List[dict]] = None) -> dict:
+    # Games are only ever written by this server, so the stored document is
+    # trusted to match GamePost and goes out without being validated again.
+    # Must produce exactly what GamePost.model_dump(mode="json") would.
+    return {
+        "id": str(game["_id"]),
+        "party_id": game["party_id"],
+        "party_name": game["party_name"],
+        "creator_id": game["creator_id"],
+        "creator_name": game["creator_name"],
+        "format": json_value(game["format"]),
+        "game_type": json_value(game["game_type"]),
+        "status": game_status(game, now),
+        "created_at": json_value(game["created_at"]),
+        "expires_at": json_value(game["expires_at"]),
+        "players": list(game["players"]),
+        "max_players": game["max_players"],
+        "match_result": json_value(game.get("match_result")),
+        "player_profiles": player_profiles,
+    }
+
+def serialize_game(game: dict, now: datetime, player_profiles: Optional[List[dict]] = None) -> dict:
+    if TRUSTED_SERIALIZATION:
+        return game_json_from_doc(game, now, player_profiles)
+    game_post = game_post_from_doc(game, None, now)
+    if player_profiles is not None:
+        game_post.player_profiles = player_profiles
+    return game_post.model_dump(mode="json")
+
+def json_bytes(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    # Same encoding FastAPI's JSONResponse uses
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def mask_creator(game: dict) -> dict:
+    # The creator's name appears again in player_profiles with expand=players
+    masked = {**game, "creator_name": "Anonymous"}
+    if game["player_profiles"] is not None:
+        masked["player_profiles"] = [
+            {**profile, "name": "Anonymous"} if profile["id"] == game["creator_id"] else profile
+            for profile in game["player_profiles"]
+        ]
+    return masked
+
+def listing_fragments(games: List[dict]):
+    # Serialize each game once for everyone (masked) and once for its
+    # creator; the listing must be rebuilt when the first open game expires
+    fragments = []
+    valid_until = None
+    for game in games:
+        unmasked = json_bytes(game)
+        if game["status"] == "open":
+            masked = json_bytes(mask_creator(game))
+            fragments.append((masked, unmasked, game["creator_id"]))
+            expires_at = datetime.fromisoformat(game["expires_at"].rstrip("Z"))
+            if valid_until is None or expires_at < valid_until:
+                valid_until = expires_at
+        else:
+            fragments.append((unmasked, unmasked, None))
+    return fragments, valid_until
+
+def listing_response(entry, current_user: User, if_none_match: Optional[str]) -> Response:
+    etag = entry.etag(current_user.id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.render(current_user.id), media_type="application/json", headers=headers)
+
+async def publish_game_event(event_type: str, game: dict, deleted: bool = False):
+    await event_hub.publish(
+        event_type,
+        game["_id"],
+        game=None if deleted else game,
+        format=game["format"],
+        party_ids=dict.fromkeys([
+            game.get("party_id"),
+            game.get("team1_party_id"),
+            game.get("team2_party_id")
+        ])
+    )
 
-def create_access_token(data: dict):
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     encoded_jwt = encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await user_from_token(token)
+
+async def user_from_token(token: str, scope: Optional[str] = None):
+    # Access tokens carry no scope; scoped tokens (stream tickets) are only
+    # accepted where that scope is asked for
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -172,29 +561,80 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope or payload.get("sid") in revoked_sessions:
             raise credentials_exception
         token_data = TokenData(email=email)
     except PyJWTError:
         raise credentials_exception
+    current_user = principal_cache.get(token_data.email)
+    if current_user is not None:
+        return current_user
     user = await collection.find_one({"email": token_data.email})
     if user is None:
         raise credentials_exception
-    return User(id=str(user["_id"]), email=user["email"], name=user["name"])
+    current_user = User(id=str(user["_id"]), email=user["email"], name=user["name"])
+    principal_cache.set(token_data.email, current_user)
+    return current_user
+
+def invalidate_user(email: str, user_id: Optional[str] = None):
+    # Must be called whenever a user document is written
+    principal_cache.invalidate(email)
+    if user_id is not None and user_profile_cache is not None:
+        user_profile_cache.invalidate(user_id)
+    # Any cached prefix could now be missing this user
+    user_search_cache.clear()
+
+def get_user_loader() -> UserLoader:
+    # One loader (and memo) per request; the profile cache is shared
+    return UserLoader(collection, user_profile_cache)
+
+async def resolve_profiles(user_loader: UserLoader, user_ids: List[str]) -> List[UserSummary]:
+    profiles = await user_loader.load_many(user_ids)
+    return [UserSummary(**profile) for profile in profiles if profile is not None]
+
+async def load_player_profiles(games: List[dict], user_loader: UserLoader) -> List[List[dict]]:
+    # Resolved concurrently so every game's players go out in one batch
+    profiles = await asyncio.gather(*(user_loader.load_many(game["players"]) for game in games))
+    return [[profile for profile in game_profiles if profile is not None] for game_profiles in profiles]
 
 @app.on_event("startup")
 async def startup_db_client():
-    global client, db, collection, party_collection, invitation_collection, game_collection
+    global client, db, collection, party_collection, invitation_collection, game_collection, archive_collection
     try:
         print("Attempting to connect to MongoDB...")
-        client = AsyncIOMotorClient(MONGODB_URL)
+        # Each worker process builds its own client (and pool) here
+        event_listeners = [TraceCommandListener(), pool_stats]
+        if METRICS_ENABLED:
+            event_listeners.append(MongoCommandMetrics())
+        client = AsyncIOMotorClient(MONGODB_URL, event_listeners=event_listeners, **mongo_client_options())
         await client.admin.command('ping')
         print("Successfully connected to MongoDB")
+        password_hasher.start()
         db = client.userdb
         collection = db.users
         party_collection = db.parties
+        party_cache.start(party_collection)
+        refresh_tokens.start(db.refresh_tokens)
+        await revoked_sessions.start(db.revoked_sessions)
         invitation_collection = db.invitations
         game_collection = db.games
+        archive_collection = db.games_archive
+        if ENSURE_INDEXES:
+            await ensure_indexes(db)
+        if INDEX_CHECK:
+            for collection_name, fields, where, problem in await check_query_shapes(db):
+                print(f"Index check: {collection_name} {{{', '.join(fields)}}} ({where}): {problem}")
+        backfilled = await backfill_search_terms(collection)
+        if backfilled:
+            print(f"Added search terms to {backfilled} users")
+        backfilled = await backfill_member_counts(party_collection)
+        if backfilled:
+            print(f"Added member counts to {backfilled} parties")
+        await expiry_scheduler.start(game_collection)
+        await game_archiver.start(game_collection, archive_collection)
+        await event_hub.start(create_broker(db))
+        await rating_service.start(db.ratings, client, retry=retry_pending_ratings)
+        install_drain_handlers()
     except Exception as e:
         print(f"Failed to connect to MongoDB: {str(e)}")
         raise
@@ -202,8 +642,17 @@ async def startup_db_client():
 @app.on_event("shutdown")
 async def shutdown_db_client():
     global client
+    # uvicorn has already waited (up to SHUTDOWN_TIMEOUT_SECONDS) for
+    # in-flight requests; stop background work before closing the pool
+    begin_drain()
+    await expiry_scheduler.stop()
+    await game_archiver.stop()
+    await event_hub.stop()
+    await rating_service.stop()
+    await revoked_sessions.stop()
     if client:
         client.close()
+    password_hasher.shutdown()
 
 origins = [
     "http://localhost:5173",
@@ -220,6 +669,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+profiler_settings = ProfilerSettings()
+app.add_middleware(ProfilingMiddleware, settings=profiler_settings)
+
+if METRICS_ENABLED:
+    # Added last so it is outermost and times the other middleware too
+    app.add_middleware(MetricsMiddleware)
+
+def cache_stats():
+    caches = {
+        "principal": principal_cache,
+        "user_search": user_search_cache,
+        "listing": listing_cache,
+        "party": party_cache.by_id,
+        "party_creator": party_cache.by_creator,
+    }
+    if user_profile_cache is not None:
+        caches["user_profile"] = user_profile_cache
+    return {name: cache.stats() for name, cache in caches.items()}
+
+def cache_stat(field):
+    return lambda: {name: stats[field] for name, stats in cache_stats().items()}
+
+def matchmaking_queue_sizes():
+    return {
+        (getattr(format, "value", format), getattr(game_type, "value", game_type)): size
+        for (format, game_type), size in matchmaking_engine.queue_sizes().items()
+    }
+
+# Service state, read at scrape time
+for name, help, labels, function, kind in [
+    ("password_hash_queue_depth", "bcrypt jobs waiting for a pool worker", (), lambda: password_hasher.queue_depth, "gauge"),
+    ("password_hash_in_flight", "bcrypt jobs running or queued", (), lambda: password_hasher.in_flight, "gauge"),
+    ("password_hash_rejected_total", "bcrypt jobs turned away with a 503", (), lambda: password_hasher.rejected, "counter"),
+    ("cache_entries", "Entries held per cache", ("cache",), cache_stat("size"), "gauge"),
+    ("cache_hits_total", "Cache lookups that hit", ("cache",), cache_stat("hits"), "counter"),
+    ("cache_misses_total", "Cache lookups that missed", ("cache",), cache_stat("misses"), "counter"),
+    ("singleflight_calls_total", "Reads that went through request coalescing", ("flight",),
+        lambda: {"listing": listing_flights.calls, "party": party_flights.calls}, "counter"),
+    ("singleflight_coalesced_total", "Reads served by another request's in-flight query", ("flight",),
+        lambda: {"listing": listing_flights.coalesced, "party": party_flights.coalesced}, "counter"),
+    ("game_event_subscribers", "Connected game event streams", (), lambda: event_hub.subscriber_count, "gauge"),
+    ("games_expired_total", "Games expired by this worker's scheduler", (), lambda: expiry_scheduler.expired_count, "counter"),
+    ("games_archived_total", "Games archived by this worker", (), lambda: game_archiver.archived_count, "counter"),
+    ("matchmaking_queue_size", "Tickets waiting per format and game type", ("format", "game_type"), matchmaking_queue_sizes, "gauge"),
+    ("mongodb_pool_connections", "Open MongoDB connections by state", ("state",),
+        lambda: {state: pool_stats.snapshot()[state] for state in ("checked_out", "idle")}, "gauge"),
+    ("refresh_tokens_issued_total", "Refresh tokens issued at login or rotation", (), lambda: refresh_tokens.issued, "counter"),
+    ("refresh_tokens_rotated_total", "Access tokens minted from a refresh token", (), lambda: refresh_tokens.rotated, "counter"),
+    ("refresh_token_reuse_total", "Already-used refresh tokens presented again (session revoked)", (), lambda: refresh_tokens.reused, "counter"),
+    ("revoked_sessions", "Sessions this worker refuses access tokens for", (), lambda: len(revoked_sessions), "gauge"),
+    ("mongodb_pool_waiting", "Operations waiting to check out a connection", (), lambda: pool_stats.waiting, "gauge"),
+    ("mongodb_pool_check_out_failures_total", "Connection check-outs that failed or timed out", (), lambda: pool_stats.check_out_failures, "counter"),
+]:
+    metrics.registry.gauge(name, help, labels, function=function, kind=kind)
+
+class ProfilingSettingsUpdate(BaseModel):
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_request_ms: Optional[float] = Field(None, ge=0)
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    # Operator endpoints only exist when DEBUG_TOKEN is configured
+    if not DEBUG_TOKEN or not x_debug_token or not hmac.compare_digest(x_debug_token, DEBUG_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/profiling", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+async def get_profiling_settings():
+    return {"sample_rate": profiler_settings.sample_rate, "slow_request_ms": profiler_settings.slow_request_ms}
+
+@app.put("/debug/profiling", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+async def update_profiling_settings(update: ProfilingSettingsUpdate):
+    # Takes effect immediately, for this worker only
+    if update.sample_rate is not None:
+        profiler_settings.sample_rate = update.sample_rate
+    if update.slow_request_ms is not None:
+        profiler_settings.slow_request_ms = update.slow_request_ms
+    return await get_profiling_settings()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Prometheus text exposition format
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/signup", response_model=User)
 async def signup(user: UserCreate):
     if collection is None:
@@ -230,16 +763,23 @@ async def signup(user: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash(user.password)
         user_data = {
             "email": user.email,
             "name": user.name,
-            "hashed_password": hashed_password
+            "hashed_password": hashed_password,
+            "search_terms": search_terms(user.name, user.email)
         }
         result = await collection.insert_one(user_data)
+        invalidate_user(user.email, str(result.inserted_id))
         return User(id=str(result.inserted_id), email=user.email, name=user.name)
+    except DuplicateKeyError:
+        # A concurrent signup for the same address won the unique index
+        raise HTTPException(status_code=400, detail="Email already registered")
     except Exception as e:
         print(f"Error creating user: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/token", response_model=Token)
@@ -248,33 +788,114 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         raise HTTPException(status_code=500, detail="Database not connected")
     
     user = await collection.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": user["email"]})
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token, session_id = await refresh_tokens.issue(str(user["_id"]), user["email"])
+    access_token = create_access_token(data={"sub": user["email"], "sid": session_id})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(request: RefreshRequest):
+    # Trades a refresh token for a new pair without checking the password
+    if refresh_tokens.collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    try:
+        rotated = await refresh_tokens.rotate(request.refresh_token)
+    except Exception as e:
+        print(f"Error refreshing token: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if rotated is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    refresh_token, session = rotated
+    access_token = create_access_token(data={"sub": session["email"], "sid": session["session_id"]})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@app.post("/token/revoke")
+async def revoke_refresh_token(request: RefreshRequest):
+    # Logout: ends the session the refresh token belongs to
+    if refresh_tokens.collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    try:
+        await refresh_tokens.revoke(request.refresh_token)
+        return {"message": "Session revoked"}
+    except Exception as e:
+        print(f"Error revoking token: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/users", response_model=Users)
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     if collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
-        users_cursor = collection.find({})  # Get all fields except hashed_password
+        # Keyset pagination on _id
+        query = {}
+        if cursor:
+            position = decode_cursor(cursor)
+            try:
+                query = {"_id": {"$gt": ObjectId(position["i"])}}
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        # Fetch one extra document to know whether another page exists
+        users = await collection.find(query, USER_PROJECTION).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+        has_more = len(users) > limit
+        users = users[:limit]
+
         users_list = []
-        async for user in users_cursor:
-            if "_id" in user and "email" in user and "name" in user:  # Ensure required fields exist
+        for user in users:
+            if "email" in user and "name" in user:  # Ensure required fields exist
                 users_list.append(User(
                     id=str(user["_id"]),
                     email=user["email"],
                     name=user["name"]
                 ))
-        return Users(users=users_list)
+
+        next_cursor = encode_cursor({"i": str(users[-1]["_id"])}) if has_more else None
+        return Users(users=users_list, next_cursor=next_cursor)
     except Exception as e:
         print(f"Error fetching users: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/users/search", response_model=List[UserSummary])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    current_user: User = Depends(get_current_user)
+):
+    if collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    prefix = normalize(q)
+    if not prefix:
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    try:
+        # Case-insensitive prefix match on name or email
+        cache_key = (prefix, limit)
+        results = user_search_cache.get(cache_key)
+        if results is None:
+            users = await collection.find(prefix_query(prefix), {"name": 1}).limit(limit).to_list(length=limit)
+            results = sorted(
+                ({"id": str(user["_id"]), "name": user["name"]} for user in users),
+                key=lambda user: (normalize(user["name"]), user["id"])
+            )
+            user_search_cache.set(cache_key, results)
+        return results
+    except Exception as e:
+        print(f"Error searching users: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/parties", response_model=Party)
@@ -285,9 +906,14 @@ async def create_party(party: PartyCreate, current_user: User = Depends(get_curr
         party_data = {
             "name": party.name,
             "creator_id": current_user.id,
-            "members": [current_user.id]
+            "members": [current_user.id],
+            # Kept equal to len(members) so the largest party a user leads
+            # is one index probe
+            "member_count": 1
         }
         result = await party_collection.insert_one(party_data)
+        party_flights.invalidate()
+        party_cache.invalidate(creator_id=current_user.id)
         return Party(
             id=str(result.inserted_id),
             name=party.name,
@@ -308,7 +934,7 @@ async def invite_to_party(
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
         # Check if party exists and user is creator
-        party = await party_collection.find_one({"_id": ObjectId(party_id)})
+        party = await party_cache.get(party_id)
         if not party:
             raise HTTPException(status_code=404, detail="Party not found")
         
@@ -347,14 +973,83 @@ async def invite_to_party(
             raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.post("/parties/{party_id}/invites", response_model=PartyBulkInvitationResponse)
+async def bulk_invite_to_party(
+    party_id: str,
+    invites: PartyBulkInvitationCreate,
+    current_user: User = Depends(get_current_user)
+):
+    if party_collection is None or invitation_collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    # Drop repeated ids, keeping the caller's order
+    invitee_ids = list(dict.fromkeys(invites.invitee_ids))
+    if not invitee_ids:
+        raise HTTPException(status_code=400, detail="No users to invite")
+    if len(invitee_ids) > MAX_BULK_INVITES:
+        raise HTTPException(status_code=400, detail=f"Cannot invite more than {MAX_BULK_INVITES} users at once")
+    try:
+        # Check if party exists and user is creator
+        party = await party_cache.get(party_id)
+        if not party:
+            raise HTTPException(status_code=404, detail="Party not found")
+
+        if party["creator_id"] != current_user.id:
+            raise HTTPException(status_code=403, detail="Only the party creator can invite users")
+
+        # Pending invitations for any of the invitees, in one query
+        already_invited = set()
+        pending_cursor = invitation_collection.find(
+            {"party_id": party_id, "invitee_id": {"$in": invitee_ids}, "status": "pending"},
+            {"invitee_id": 1}
+        )
+        async for inv in pending_cursor:
+            already_invited.add(inv["invitee_id"])
+
+        members = set(party["members"])
+        results = []
+        new_invitations = []
+        created_at = datetime.utcnow()
+        for invitee_id in invitee_ids:
+            if invitee_id in members:
+                results.append(PartyBulkInvitationResult(invitee_id=invitee_id, status="already_member"))
+            elif invitee_id in already_invited:
+                results.append(PartyBulkInvitationResult(invitee_id=invitee_id, status="already_invited"))
+            else:
+                results.append(PartyBulkInvitationResult(invitee_id=invitee_id, status="pending"))
+                new_invitations.append({
+                    "party_id": party_id,
+                    "party_name": party["name"],
+                    "inviter_id": current_user.id,
+                    "inviter_name": current_user.name,
+                    "invitee_id": invitee_id,
+                    "status": "pending",
+                    "created_at": created_at
+                })
+
+        if new_invitations:
+            result = await invitation_collection.insert_many(new_invitations)
+            inserted_ids = iter(result.inserted_ids)
+            for invite_result in results:
+                if invite_result.status == "pending":
+                    invite_result.invitation_id = str(next(inserted_ids))
+
+        return PartyBulkInvitationResponse(results=results)
+    except Exception as e:
+        print(f"Error creating invitations: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @app.get("/parties/{user_id}")
 async def get_user_parties(
     user_id: str, 
-    current_user: User = Depends(get_current_user)
+    expand: Optional[Literal["members"]] = None,
+    current_user: User = Depends(get_current_user),
+    user_loader: UserLoader = Depends(get_user_loader)
 ):
     if party_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
-    try:
+    async def load_parties():
         parties_cursor = party_collection.find({"members": user_id})
         parties = []
         async for party in parties_cursor:
@@ -364,6 +1059,15 @@ async def get_user_parties(
                 creator_id=party["creator_id"],
                 members=party["members"]
             ))
+
+        if expand == "members":
+            profiles = await asyncio.gather(*(resolve_profiles(user_loader, party.members) for party in parties))
+            for party, member_profiles in zip(parties, profiles):
+                party.member_profiles = member_profiles
+        return parties
+
+    try:
+        parties = await party_flights.do(("parties", user_id, expand), load_parties)
         return {"parties": parties}
     except Exception as e:
         print(f"Error fetching parties: {str(e)}")
@@ -427,10 +1131,16 @@ async def respond_to_invitation(
 
         # If accepted, add user to party members
         if response.status == "accepted":
-            await party_collection.update_one(
-                {"_id": ObjectId(invitation["party_id"])},
-                {"$addToSet": {"members": current_user.id}}
+            # Only matches when the user is not yet a member, so the count
+            # moves together with the members array
+            party = await party_collection.find_one_and_update(
+                {"_id": ObjectId(invitation["party_id"]), "members": {"$ne": current_user.id}},
+                {"$push": {"members": current_user.id}, "$inc": {"member_count": 1}},
+                projection={"creator_id": 1}
             )
+            party_flights.invalidate()
+            if party:
+                party_cache.invalidate(invitation["party_id"], party["creator_id"])
 
         return {"message": f"Invitation {response.status}"}
     except Exception as e:
@@ -452,7 +1162,7 @@ async def delete_party(
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
         # Check if party exists and user is creator
-        party = await party_collection.find_one({"_id": ObjectId(party_id)})
+        party = await party_cache.get(party_id)
         if not party:
             raise HTTPException(status_code=404, detail="Party not found")
         
@@ -464,6 +1174,8 @@ async def delete_party(
         
         # Delete the party
         result = await party_collection.delete_one({"_id": ObjectId(party_id)})
+        party_flights.invalidate()
+        party_cache.invalidate(party_id, party["creator_id"])
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Party not found")
@@ -475,6 +1187,59 @@ async def delete_party(
             raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+async def has_active_game(user_id: str) -> bool:
+    game = await game_collection.find_one(
+        {"players": user_id, "status": {"$in": ["open", "in_progress"]}},
+        {"_id": 1}
+    )
+    return game is not None
+
+async def validate_game_request(game: GamePostCreate, current_user: User):
+    # Checks shared by listings and matchmaking; returns (party_id, party_name)
+    # For 1v1 games, party_id is optional
+    if game.format == GameFormat.ONE_V_ONE:
+        party_name = "Solo Queue"
+        party_id = None
+    else:
+        # For team formats, require and validate party
+        if not game.party_id:
+            raise HTTPException(status_code=400, detail="Party ID is required for team games")
+        
+        try:
+            party = await party_cache.get(game.party_id)
+        except:
+            raise HTTPException(status_code=400, detail="Invalid party ID format")
+            
+        if not party:
+            raise HTTPException(status_code=404, detail="Party not found")
+        
+        party_name = party["name"]
+        party_id = game.party_id
+
+        # For team formats (4v4, 5v5), only party creator can create listings
+        if game.format in [GameFormat.FIVE_V_FIVE, GameFormat.FOUR_V_FOUR]:
+            if party["creator_id"] != current_user.id:
+                raise HTTPException(status_code=403, detail="Only the party creator can create team format games")
+            
+            # Validate party size for game format
+            party_size = party["member_count"]
+            if game.format == GameFormat.FIVE_V_FIVE and party_size < 5:
+                raise HTTPException(status_code=400, detail="Need at least 5 players in party for 5v5")
+            elif game.format == GameFormat.FOUR_V_FOUR and party_size < 4:
+                raise HTTPException(status_code=400, detail="Need at least 4 players in party for 4v4")
+
+    # Check if user already has an active game, as creator or player
+    if await has_active_game(current_user.id):
+        raise HTTPException(status_code=400, detail="You already have an active game listing")
+
+    # Validate game type for 1v1
+    if game.format == GameFormat.ONE_V_ONE and game.game_type != GameType.DEATHMATCH:
+        raise HTTPException(status_code=400, detail="1v1 format only supports deathmatch game type")
+    elif game.format != GameFormat.ONE_V_ONE and game.game_type == GameType.DEATHMATCH:
+        raise HTTPException(status_code=400, detail="Deathmatch is only available for 1v1 format")
+
+    return party_id, party_name
+
 @app.post("/games", response_model=GamePost)
 async def create_game_post(
     game: GamePostCreate,
@@ -483,62 +1248,17 @@ async def create_game_post(
     if party_collection is None or game_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
-        # For 1v1 games, party_id is optional
-        if game.format == GameFormat.ONE_V_ONE:
-            party_name = "Solo Queue"
-            party_id = None
-        else:
-            # For team formats, require and validate party
-            if not game.party_id:
-                raise HTTPException(status_code=400, detail="Party ID is required for team games")
-            
-            try:
-                party = await party_collection.find_one({"_id": ObjectId(game.party_id)})
-            except:
-                raise HTTPException(status_code=400, detail="Invalid party ID format")
-                
-            if not party:
-                raise HTTPException(status_code=404, detail="Party not found")
-            
-            party_name = party["name"]
-            party_id = game.party_id
-
-            # For team formats (4v4, 5v5), only party creator can create listings
-            if game.format in [GameFormat.FIVE_V_FIVE, GameFormat.FOUR_V_FOUR]:
-                if party["creator_id"] != current_user.id:
-                    raise HTTPException(status_code=403, detail="Only the party creator can create team format games")
-                
-                # Validate party size for game format
-                party_size = len(party["members"])
-                if game.format == GameFormat.FIVE_V_FIVE and party_size < 5:
-                    raise HTTPException(status_code=400, detail="Need at least 5 players in party for 5v5")
-                elif game.format == GameFormat.FOUR_V_FOUR and party_size < 4:
-                    raise HTTPException(status_code=400, detail="Need at least 4 players in party for 4v4")
-
-        # Check if user already has an active game
-        existing_game = await game_collection.find_one({
-            "creator_id": current_user.id,
-            "status": {"$in": ["open", "in_progress"]}
-        })
-        if existing_game:
-            raise HTTPException(status_code=400, detail="You already have an active game listing")
+        if matchmaking_engine.ticket_for(current_user.id) is not None:
+            raise HTTPException(status_code=400, detail="Leave the matchmaking queue before creating a game")
 
-        # Validate game type for 1v1
-        if game.format == GameFormat.ONE_V_ONE and game.game_type != GameType.DEATHMATCH:
-            raise HTTPException(status_code=400, detail="1v1 format only supports deathmatch game type")
-        elif game.format != GameFormat.ONE_V_ONE and game.game_type == GameType.DEATHMATCH:
-            raise HTTPException(status_code=400, detail="Deathmatch is only available for 1v1 format")
+        party_id, party_name = await validate_game_request(game, current_user)
 
         # Calculate max players based on format
-        max_players = {
-            GameFormat.FIVE_V_FIVE: 10,
-            GameFormat.FOUR_V_FOUR: 8,
-            GameFormat.ONE_V_ONE: 2
-        }[game.format]
+        max_players = MAX_PLAYERS[game.format]
 
         # Set expiration time (30 minutes from now) using UTC
         created_at = datetime.utcnow()
-        expires_at = created_at + timedelta(minutes=30)
+        expires_at = created_at + timedelta(minutes=GAME_LISTING_MINUTES)
 
         # Create game post
         game_data = {
@@ -558,74 +1278,251 @@ async def create_game_post(
             "team2_party_id": None
         }
         result = await game_collection.insert_one(game_data)
-        
-        return GamePost(
-            id=str(result.inserted_id),
-            **game_data
-        )
+        expiry_scheduler.schedule(result.inserted_id, expires_at)
+        await publish_game_event("game_created", game_data)
+
+        return game_post_from_doc(game_data)
     except Exception as e:
         print(f"Error creating game post: {str(e)}")
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def get_matchmaking_rating(current_user: User, party_id: Optional[str]) -> float:
+    # Team queues match parties, 1v1 queues match users
+    if party_id:
+        return rating_service.rating_of("party", party_id)
+    return rating_service.rating_of("user", current_user.id)
+
+async def create_matched_game(first, second):
+    # The ticket that waited longest plays as the creator / team 1
+    game_format = GameFormat(first.format)
+    created_at = datetime.utcnow()
+    game_data = {
+        "party_id": first.party_id,
+        "party_name": first.party_name,
+        "creator_id": first.user_id,
+        "creator_name": first.user_name,
+        "format": game_format,
+        "game_type": GameType(first.game_type),
+        "status": "in_progress",
+        "created_at": created_at,
+        "expires_at": created_at + timedelta(minutes=GAME_LISTING_MINUTES),
+        "players": [first.user_id, second.user_id],
+        "ready_players": [],
+        "max_players": MAX_PLAYERS[game_format],
+        "team1_party_id": first.party_id,
+        "team2_party_id": second.party_id,
+        "matchmade": True
+    }
+    await game_collection.insert_one(game_data)
+    matchmaking_engine.record_match(str(game_data["_id"]), first, second)
+    await publish_game_event("game_matched", game_data)
+    return game_data
+
+def matchmaking_status(current_user: User) -> MatchmakingStatus:
+    ticket = matchmaking_engine.ticket_for(current_user.id)
+    if ticket is not None:
+        return MatchmakingStatus(
+            status="queued",
+            ticket_id=ticket.ticket_id,
+            format=ticket.format,
+            game_type=ticket.game_type,
+            queued_at=datetime.utcfromtimestamp(ticket.enqueued_at)
+        )
+    game_id = matchmaking_engine.matched_game(current_user.id)
+    if game_id is not None:
+        return MatchmakingStatus(status="matched", game_id=game_id)
+    return MatchmakingStatus(status="idle")
+
+def require_single_worker():
+    # Queues live in process memory, so with several workers two players
+    # could wait forever in different queues
+    if WEB_CONCURRENCY > 1:
+        raise HTTPException(status_code=503, detail="Matchmaking is unavailable when running several workers")
+
+@app.post("/matchmaking/queue", response_model=MatchmakingStatus, dependencies=[Depends(require_single_worker)])
+async def enqueue_for_match(
+    request: GamePostCreate,
+    current_user: User = Depends(get_current_user)
+):
+    if party_collection is None or game_collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    try:
+        if matchmaking_engine.ticket_for(current_user.id) is not None:
+            raise HTTPException(status_code=400, detail="You are already in the matchmaking queue")
+
+        party_id, party_name = await validate_game_request(request, current_user)
+        rating = get_matchmaking_rating(current_user, party_id)
+
+        try:
+            ticket, opponent = matchmaking_engine.enqueue(
+                current_user.id,
+                current_user.name,
+                request.format.value,
+                request.game_type.value,
+                party_id=party_id,
+                party_name=party_name,
+                rating=rating
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="You are already in the matchmaking queue")
+
+        # An opponent may have joined or been matched into a game since
+        # queueing; they are dropped and the next one is tried
+        while opponent is not None and await has_active_game(opponent.user_id):
+            opponent = matchmaking_engine.match(ticket)
+        if opponent is None:
+            return matchmaking_status(current_user)
+
+        try:
+            await create_matched_game(opponent, ticket)
+        except Exception:
+            # Do not lose the opponent's place in line
+            matchmaking_engine.requeue(opponent)
+            raise
+        return matchmaking_status(current_user)
+    except Exception as e:
+        print(f"Error joining matchmaking: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/matchmaking/queue", response_model=MatchmakingStatus, dependencies=[Depends(require_single_worker)])
+async def get_matchmaking_status(current_user: User = Depends(get_current_user)):
+    return matchmaking_status(current_user)
+
+@app.delete("/matchmaking/queue", dependencies=[Depends(require_single_worker)])
+async def leave_matchmaking_queue(current_user: User = Depends(get_current_user)):
+    if not matchmaking_engine.cancel(current_user.id):
+        raise HTTPException(status_code=404, detail="You are not in the matchmaking queue")
+    return {"message": "Left matchmaking queue"}
+
+LEADERBOARD_KINDS = {"users": "user", "parties": "party"}
+
+@app.get("/leaderboard/{kind}", response_model=LeaderboardPage)
+async def get_leaderboard(
+    kind: Literal["users", "parties"],
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    board = rating_service.boards[LEADERBOARD_KINDS[kind]]
+    return LeaderboardPage(
+        entries=[LeaderboardEntry(rank=rank, **entry) for rank, entry in board.top(offset, limit)],
+        total=len(board)
+    )
+
+@app.get("/leaderboard/{kind}/{subject_id}", response_model=LeaderboardEntry)
+async def get_leaderboard_rank(
+    kind: Literal["users", "parties"],
+    subject_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    board = rating_service.boards[LEADERBOARD_KINDS[kind]]
+    rank = board.rank(subject_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="No rated games yet")
+    return LeaderboardEntry(rank=rank, **board.get(subject_id))
+
 @app.get("/games/party/{party_id}", response_model=List[GamePost])
 async def get_party_games(
     party_id: str,
-    current_user: User = Depends(get_current_user)
+    expand: Optional[Literal["players"]] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    user_loader: UserLoader = Depends(get_user_loader)
 ):
     if game_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
-        # Get current time in UTC
-        current_time = datetime.utcnow()
-        
-        # Update expired games
-        await game_collection.update_many(
-            {
-                "party_id": party_id,
-                "status": "open",
-                "expires_at": {"$lt": current_time}
-            },
-            {"$set": {"status": "expired"}}
-        )
-
-        # Fetch games
-        games_cursor = game_collection.find({"party_id": party_id})
-        games = []
-        async for game in games_cursor:
-            # Hide creator info if game is open and user is not the creator
-            if game["status"] == "open" and game["creator_id"] != current_user.id:
-                game["creator_name"] = "Anonymous"
-            
-            # Convert MongoDB datetime to UTC if needed
-            created_at = game["created_at"]
-            expires_at = game["expires_at"]
-            if created_at.tzinfo is None:
-                created_at = created_at.replace(tzinfo=None)
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=None)
-            
-            games.append(GamePost(
-                id=str(game["_id"]),
-                party_id=game["party_id"],
-                party_name=game["party_name"],
-                creator_id=game["creator_id"],
-                creator_name=game["creator_name"],
-                format=game["format"],
-                game_type=game["game_type"],
-                status=game["status"],
-                created_at=created_at,
-                expires_at=expires_at,
-                players=game["players"],
-                max_players=game["max_players"],
-                match_result=game.get("match_result")
-            ))
-        return games
+        cache_key = ("party_games", party_id, expand)
+        version = event_hub.version
+        entry = listing_cache.get(cache_key, version)
+        if entry is None:
+            async def build_listing():
+                # Expiry is handled by the scheduler; this endpoint only reads.
+                # Games are built unmasked; masking is applied per viewer.
+                current_time = datetime.utcnow()
+                page = await game_collection.find({"party_id": party_id}).to_list(length=None)
+
+                profiles = [None] * len(page)
+                if expand == "players":
+                    profiles = await load_player_profiles(page, user_loader)
+                with stage("serialize"):
+                    games = [serialize_game(game, current_time, game_profiles) for game, game_profiles in zip(page, profiles)]
+                    fragments, valid_until = listing_fragments(games)
+                return listing_cache.put(cache_key, version, valid_until, b"[", b"]", fragments)
+
+            entry = await listing_flights.do((cache_key, version), build_listing)
+        return listing_response(entry, current_user, if_none_match)
     except Exception as e:
         print(f"Error fetching games: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def raise_join_error(game: Optional[dict], current_user: User, leader_party_size: int, current_time: datetime):
+    # The conditional update matched nothing; the game as read afterwards says why
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+
+    if current_user.id in game["players"]:
+        raise HTTPException(status_code=400, detail="You are already in this game")
+
+    if len(game["players"]) >= game["max_players"]:
+        raise HTTPException(status_code=400, detail="Game is full")
+
+    if game["status"] != "open":
+        raise HTTPException(status_code=400, detail="Game is not open")
+
+    if game["expires_at"] < current_time:
+        raise HTTPException(status_code=400, detail="Game has expired")
+
+    # For team formats, need to lead a big enough party
+    required_size = TEAM_FORMAT_SIZES.get(game["format"])
+    if required_size:
+        if leader_party_size == 0:
+            raise HTTPException(status_code=400, detail="You must be a party creator to join team format games")
+        if leader_party_size < required_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"You need a party with at least {required_size} members to join this game"
+            )
+
+    # Someone else changed the game between our update and this read
+    raise HTTPException(status_code=409, detail="Game changed while joining, please retry")
+
+async def join_if_open(game_id: str, current_user: User, current_time: datetime, leader_party: Optional[dict] = None):
+    # Capacity, status, expiry and format are checked in the filter, so
+    # concurrent joiners cannot both pass and overfill the game. 1v1 is always
+    # joinable; a team format only when the caller leads a big enough party,
+    # which then becomes team 2.
+    leader_party_size = leader_party["member_count"] if leader_party else 0
+    formats = [GameFormat.ONE_V_ONE.value] + [
+        game_format.value for game_format, size in TEAM_FORMAT_SIZES.items() if leader_party_size >= size
+    ]
+    update = {
+        "players": {"$concatArrays": ["$players", [current_user.id]]},
+        "status": "in_progress"
+    }
+    if len(formats) > 1:
+        update["team2_party_id"] = {"$cond": [
+            {"$eq": ["$format", GameFormat.ONE_V_ONE.value]},
+            "$team2_party_id",
+            str(leader_party["_id"])
+        ]}
+    return await game_collection.find_one_and_update(
+        {
+            "_id": ObjectId(game_id),
+            "format": {"$in": formats},
+            "status": "open",
+            "expires_at": {"$gte": current_time},
+            "players": {"$ne": current_user.id},
+            "$expr": {"$lt": [{"$size": "$players"}, "$max_players"]}
+        },
+        [{"$set": update}],
+        return_document=ReturnDocument.AFTER
+    )
+
 @app.post("/games/{game_id}/join")
 async def join_game(
     game_id: str,
@@ -634,71 +1531,18 @@ async def join_game(
     if game_collection is None or party_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
-        game = await game_collection.find_one({"_id": ObjectId(game_id)})
-        if not game:
-            raise HTTPException(status_code=404, detail="Game not found")
-        
-        if current_user.id in game["players"]:
-            raise HTTPException(status_code=400, detail="You are already in this game")
-        
-        if len(game["players"]) >= game["max_players"]:
-            raise HTTPException(status_code=400, detail="Game is full")
-        
-        if game["status"] != "open":
-            raise HTTPException(status_code=400, detail="Game is not open")
-
-        # Ensure we're comparing UTC times
         current_time = datetime.utcnow()
-        expires_at = game["expires_at"]
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=None)
-
-        if expires_at < current_time:
-            raise HTTPException(status_code=400, detail="Game has expired")
 
-        # For team formats, need to be in a party
-        if game["format"] in [GameFormat.FIVE_V_FIVE, GameFormat.FOUR_V_FOUR]:
-            # Get user's parties where they are the creator
-            user_parties = await party_collection.find({
-                "creator_id": current_user.id
-            }).to_list(length=None)
-
-            if not user_parties:
-                raise HTTPException(status_code=400, detail="You must be a party creator to join team format games")
-
-            # Check if any of user's parties has enough members
-            valid_party = None
-            required_size = 5 if game["format"] == GameFormat.FIVE_V_FIVE else 4
-            for party in user_parties:
-                if len(party["members"]) >= required_size:
-                    valid_party = party
-                    break
-
-            if not valid_party:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"You need a party with at least {required_size} members to join this game"
-                )
+        # The largest party the caller leads decides which team formats they
+        # can join; it is usually cached, so a join is one round trip
+        leader_party = await party_cache.largest_led_by(current_user.id)
+        game = await join_if_open(game_id, current_user, current_time, leader_party)
+        if game is None:
+            target = await game_collection.find_one({"_id": ObjectId(game_id)})
+            leader_party_size = leader_party["member_count"] if leader_party else 0
+            raise_join_error(target, current_user, leader_party_size, current_time)
 
-            # Update game with second team's party ID
-            update_data = {
-                "$addToSet": {"players": current_user.id},
-                "$set": {
-                    "status": "in_progress",
-                    "team2_party_id": str(valid_party["_id"])
-                }
-            }
-        else:
-            # For 1v1, any user can join
-            update_data = {
-                "$addToSet": {"players": current_user.id},
-                "$set": {"status": "in_progress"}
-            }
-
-        await game_collection.update_one(
-            {"_id": ObjectId(game_id)},
-            update_data
-        )
+        await publish_game_event("game_joined", game)
 
         return {"message": "Joined game successfully"}
     except Exception as e:
@@ -707,6 +1551,79 @@ async def join_game(
             raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def is_rated(game: dict, result: MatchResult) -> bool:
+    # Only results between the game's two sides are rated
+    players = game["players"]
+    if result.winner_id == result.loser_id or result.winner_id not in players or result.loser_id not in players:
+        return False
+    if game["format"] == GameFormat.ONE_V_ONE:
+        return True
+    return bool(game.get("team1_party_id") and game.get("team2_party_id"))
+
+async def update_ratings(game: dict, result: MatchResult):
+    # Callers only pass games with ratings_pending set (see is_rated); the
+    # flag is cleared together with the rating writes
+    async def mark_rated(session):
+        await game_collection.update_one(
+            {"_id": game["_id"]},
+            {"$unset": {"ratings_pending": "", "ratings_retry_at": ""}},
+            session=session
+        )
+
+    try:
+        if game["format"] == GameFormat.ONE_V_ONE:
+            await rating_service.record_result(
+                "user",
+                result.winner_id,
+                result.loser_id,
+                winner_name=result.winner_name,
+                loser_name=result.loser_name,
+                on_applied=mark_rated
+            )
+            return
+
+        # Team games are rated per party; the creator leads team 1
+        team1_party_id = game["team1_party_id"]
+        team2_party_id = game["team2_party_id"]
+        team2_party = await party_cache.get(team2_party_id)
+        names = {
+            team1_party_id: game["party_name"],
+            team2_party_id: team2_party["name"] if team2_party else None
+        }
+        if result.winner_id == game["creator_id"]:
+            winner_party_id, loser_party_id = team1_party_id, team2_party_id
+        else:
+            winner_party_id, loser_party_id = team2_party_id, team1_party_id
+        await rating_service.record_result(
+            "party",
+            winner_party_id,
+            loser_party_id,
+            winner_name=names[winner_party_id],
+            loser_name=names[loser_party_id],
+            on_applied=mark_rated
+        )
+    except Exception as e:
+        # The result is stored with ratings_pending still set, so
+        # retry_pending_ratings applies the update later
+        print(f"Error updating ratings: {str(e)}")
+
+async def retry_pending_ratings():
+    # Called from the rating service's timer. Each game is leased first so
+    # workers do not retry the same result at once; a worker that dies mid
+    # retry leaves the lease to run out. Without transactions, a crash
+    # between the rating writes and clearing the flag can apply a result
+    # twice.
+    while True:
+        now = datetime.utcnow()
+        game = await game_collection.find_one_and_update(
+            {"ratings_pending": True, "ratings_retry_at": {"$lte": now}},
+            {"$set": {"ratings_retry_at": now + timedelta(seconds=RATING_RETRY_LEASE_SECONDS)}}
+        )
+        if game is None:
+            return
+        result = MatchResult(**{field: game["match_result"][field] for field in MatchResult.model_fields})
+        await update_ratings(game, result)
+
 @app.post("/games/{game_id}/result")
 async def submit_match_result(
     game_id: str,
@@ -726,11 +1643,8 @@ async def submit_match_result(
         # For team formats, only party creators can submit results
         if game["format"] in [GameFormat.FIVE_V_FIVE, GameFormat.FOUR_V_FOUR]:
             if current_user.id != game["creator_id"] and not (
-                game.get("team2_party_id") and 
-                await party_collection.find_one({
-                    "_id": ObjectId(game["team2_party_id"]),
-                    "creator_id": current_user.id
-                })
+                game.get("team2_party_id") and
+                (await party_cache.get(game["team2_party_id"]) or {}).get("creator_id") == current_user.id
             ):
                 raise HTTPException(status_code=403, detail="Only party creators can submit results for team games")
         else:
@@ -741,23 +1655,34 @@ async def submit_match_result(
             if current_user.id not in [result.winner_id, result.loser_id]:
                 raise HTTPException(status_code=403, detail="You can only submit results involving yourself")
 
-        await game_collection.update_one(
-            {"_id": ObjectId(game_id)},
-            {
-                "$set": {
-                    "status": "completed",
-                    "match_result": {
-                        "winner_id": result.winner_id,
-                        "winner_name": result.winner_name,
-                        "loser_id": result.loser_id,
-                        "loser_name": result.loser_name,
-                        "score": result.score,
-                        "reported_by": current_user.id,
-                        "reported_at": datetime.utcnow()
-                    }
-                }
-            }
+        match_result = {
+            "winner_id": result.winner_id,
+            "winner_name": result.winner_name,
+            "loser_id": result.loser_id,
+            "loser_name": result.loser_name,
+            "score": result.score,
+            "reported_by": current_user.id,
+            "reported_at": datetime.utcnow()
+        }
+        completion = {"status": "completed", "match_result": match_result}
+        rated = is_rated(game, result)
+        if rated:
+            # Stays set until the rating update lands; the lease keeps the
+            # retry loop off it while this request makes the first attempt
+            completion["ratings_pending"] = True
+            completion["ratings_retry_at"] = datetime.utcnow() + timedelta(seconds=RATING_RETRY_LEASE_SECONDS)
+        # Conditional so only one of two racing submissions is recorded and rated
+        update = await game_collection.update_one(
+            {"_id": ObjectId(game_id), "status": "in_progress"},
+            {"$set": completion}
         )
+        if update.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Game is not in progress")
+
+        game.update(completion)
+        if rated:
+            await update_ratings(game, result)
+        await publish_game_event("game_completed", game)
 
         return {"message": "Match result submitted successfully"}
     except Exception as e:
@@ -784,7 +1709,9 @@ async def delete_game(
         result = await game_collection.delete_one({"_id": ObjectId(game_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Game not found")
-            
+
+        await publish_game_event("game_deleted", game, deleted=True)
+
         return {"message": "Game deleted successfully"}
     except Exception as e:
         print(f"Error deleting game: {str(e)}")
@@ -800,94 +1727,321 @@ async def ready_up(
     if game_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
     try:
-        game = await game_collection.find_one({"_id": ObjectId(game_id)})
-        if not game:
-            raise HTTPException(status_code=404, detail="Game not found")
-        
-        if current_user.id not in game["players"]:
-            raise HTTPException(status_code=403, detail="You must be a player to ready up")
-        
-        if game["status"] != "in_progress":
-            raise HTTPException(status_code=400, detail="Game is not in progress")
+        # Mark the player ready and flip the game to ready_to_start in the
+        # same update, so the last of several concurrent ready-ups always
+        # sees every other player's ready state
+        game = await game_collection.find_one_and_update(
+            {
+                "_id": ObjectId(game_id),
+                "players": current_user.id,
+                "status": "in_progress"
+            },
+            [
+                {"$set": {"ready_players": {"$setUnion": [
+                    {"$ifNull": ["$ready_players", []]},
+                    [current_user.id]
+                ]}}},
+                {"$set": {"status": {"$cond": [
+                    {"$gte": [{"$size": "$ready_players"}, {"$size": "$players"}]},
+                    "ready_to_start",
+                    "$status"
+                ]}}}
+            ],
+            return_document=ReturnDocument.AFTER
+        )
+        if game is None:
+            # Nothing matched; re-read the game to say why
+            game = await game_collection.find_one({"_id": ObjectId(game_id)})
+            if not game:
+                raise HTTPException(status_code=404, detail="Game not found")
 
-        # Add player to ready list if not already ready
-        if current_user.id not in game.get("ready_players", []):
-            await game_collection.update_one(
-                {"_id": ObjectId(game_id)},
-                {"$addToSet": {"ready_players": current_user.id}}
-            )
+            if current_user.id not in game["players"]:
+                raise HTTPException(status_code=403, detail="You must be a player to ready up")
 
-        # Check if all players are ready
-        updated_game = await game_collection.find_one({"_id": ObjectId(game_id)})
-        if len(updated_game.get("ready_players", [])) == len(updated_game["players"]):
-            await game_collection.update_one(
-                {"_id": ObjectId(game_id)},
-                {"$set": {"status": "ready_to_start"}}
-            )
-            return {"message": "All players ready, game can start!"}
+            raise HTTPException(status_code=400, detail="Game is not in progress")
+
+        ready_count = len(game["ready_players"])
+        player_count = len(game["players"])
+        if game["status"] == "ready_to_start":
+            await publish_game_event("game_ready", game)
+            return {
+                "message": "All players ready, game can start!",
+                "ready_count": ready_count,
+                "player_count": player_count
+            }
 
-        return {"message": "Ready status updated"}
+        await publish_game_event("player_ready", game)
+        return {
+            "message": "Ready status updated",
+            "ready_count": ready_count,
+            "player_count": player_count
+        }
     except Exception as e:
         print(f"Error updating ready status: {str(e)}")
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@app.get("/games", response_model=List[GamePost])
-async def get_all_games(current_user: User = Depends(get_current_user)):
+async def get_stream_user(
+    ticket: Optional[str] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    # EventSource cannot send an Authorization header, so browsers pass a
+    # ticket from POST /games/events/ticket in the query string instead
+    if ticket is not None:
+        return await user_from_token(ticket, scope="events")
+    if token is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await user_from_token(token)
+
+@app.post("/games/events/ticket", response_model=StreamTicket)
+async def create_stream_ticket(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user)
+):
+    # Short-lived, and only valid for opening /games/events, so it does
+    # little harm if the URL ends up in a log
+    session_id = decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sid")
+    claims = {"sub": current_user.email, "scope": "events"}
+    if session_id is not None:
+        claims["sid"] = session_id
+    ticket = create_access_token(claims, expires_delta=timedelta(seconds=STREAM_TICKET_SECONDS))
+    return StreamTicket(ticket=ticket, expires_in=STREAM_TICKET_SECONDS)
+
+@app.get("/games/events")
+async def stream_game_events(
+    party_id: Optional[str] = None,
+    format: Optional[GameFormat] = None,
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+    current_user: User = Depends(get_stream_user)
+):
+    # Server-Sent Events; EventSource reconnects send Last-Event-ID
+    if since is None:
+        since = last_event_id
+    subscription = event_hub.subscribe(since)
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is CLOSED:
+                    # Worker is shutting down; EventSource reconnects with
+                    # Last-Event-ID and resumes on another worker
+                    return
+                if event is RESET:
+                    yield "event: reset\ndata: {}\n\n"
+                    continue
+                if party_id and party_id not in event["party_ids"]:
+                    continue
+                if format and event["format"] != format:
+                    continue
+
+                game = event["game"]
+                data = {
+                    "offset": event["offset"],
+                    "type": event["type"],
+                    "game_id": event["game_id"],
+                    "game": game_post_from_doc(game, current_user).model_dump(mode="json") if game else None
+                }
+                yield f"id: {event['offset']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def game_filter_clauses(
+    now: datetime,
+    format: Optional[GameFormat] = None,
+    game_type: Optional[GameType] = None,
+    status: Optional[str] = None,
+    party_id: Optional[str] = None,
+    has_capacity: bool = False,
+    created_after: Optional[datetime] = None
+) -> List[dict]:
+    # Equality on status/format leads the games indexes; the rest narrows
+    # the range or is checked on the documents those predicates select
+    clauses = []
+    if status == "open":
+        clauses.append({"status": "open", "expires_at": {"$gt": now}})
+    elif status == "expired":
+        # Includes open games past their deadline that are not swept yet
+        clauses.append({"$or": [
+            {"status": "expired"},
+            {"status": "open", "expires_at": {"$lte": now}}
+        ]})
+    elif status is not None:
+        clauses.append({"status": status})
+    if format is not None:
+        clauses.append({"format": format.value})
+    if game_type is not None:
+        clauses.append({"game_type": game_type.value})
+    if party_id is not None:
+        clauses.append({"party_id": party_id})
+    if created_after is not None:
+        if created_after.tzinfo is not None:
+            created_after = created_after.astimezone(timezone.utc).replace(tzinfo=None)
+        clauses.append({"created_at": {"$gt": created_after}})
+    if has_capacity:
+        clauses.append({"$expr": {"$lt": [{"$size": "$players"}, "$max_players"]}})
+    return clauses
+
+def and_query(clauses: List[dict]) -> dict:
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else {}
+
+@app.get("/games", response_model=GamePage)
+async def get_all_games(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[GameFormat] = None,
+    game_type: Optional[GameType] = None,
+    status: Optional[Literal["open", "in_progress", "ready_to_start", "completed", "expired"]] = None,
+    party_id: Optional[str] = None,
+    open_only: bool = False,
+    has_capacity: bool = False,
+    created_after: Optional[datetime] = None,
+    sort: Literal["newest", "oldest"] = "newest",
+    expand: Optional[Literal["players"]] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    user_loader: UserLoader = Depends(get_user_loader)
+):
     if game_collection is None:
         raise HTTPException(status_code=500, detail="Database not connected")
+    if open_only:
+        if status not in (None, "open"):
+            raise HTTPException(status_code=400, detail="open_only cannot be combined with another status")
+        status = "open"
     try:
-        # Get current time in UTC
-        current_time = datetime.utcnow()
-        
-        # Update expired games
-        await game_collection.update_many(
-            {
-                "status": "open",
-                "expires_at": {"$lt": current_time}
-            },
-            {"$set": {"status": "expired"}}
-        )
+        newest_first = sort == "newest"
+        cache_key = ("games", limit, cursor, format, game_type, status, party_id, has_capacity, created_after, sort, expand)
+        version = event_hub.version
+        entry = listing_cache.get(cache_key, version)
+        if entry is None:
+            async def build_listing():
+                clauses = game_filter_clauses(
+                    datetime.utcnow(),
+                    format=format,
+                    game_type=game_type,
+                    status=status,
+                    party_id=party_id,
+                    has_capacity=has_capacity,
+                    created_after=created_after
+                )
+                if cursor:
+                    clauses.append(games_after_cursor(cursor, newest_first))
+                page, next_cursor = await fetch_game_page(game_collection, and_query(clauses), limit, newest_first)
+
+                # Expiry is handled by the scheduler; this endpoint only reads.
+                # Games are built unmasked; masking is applied per viewer.
+                current_time = datetime.utcnow()
+                profiles = [None] * len(page)
+                if expand == "players":
+                    profiles = await load_player_profiles(page, user_loader)
+                with stage("serialize"):
+                    games = [serialize_game(game, current_time, game_profiles) for game, game_profiles in zip(page, profiles)]
+                    fragments, valid_until = listing_fragments(games)
+                return listing_cache.put(
+                    cache_key,
+                    version,
+                    valid_until,
+                    b'{"games":[',
+                    b'],"next_cursor":' + json_bytes(next_cursor) + b"}",
+                    fragments
+                )
 
-        # Fetch all games
-        games_cursor = game_collection.find({})
-        games = []
-        async for game in games_cursor:
-            # Hide creator info if game is open and user is not the creator
-            if game["status"] == "open" and game["creator_id"] != current_user.id:
-                game["creator_name"] = "Anonymous"
-            
-            # Convert MongoDB datetime to UTC if needed
-            created_at = game["created_at"]
-            expires_at = game["expires_at"]
-            if created_at.tzinfo is None:
-                created_at = created_at.replace(tzinfo=None)
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=None)
-            
-            games.append(GamePost(
-                id=str(game["_id"]),
-                party_id=game["party_id"],
-                party_name=game["party_name"],
-                creator_id=game["creator_id"],
-                creator_name=game["creator_name"],
-                format=game["format"],
-                game_type=game["game_type"],
-                status=game["status"],
-                created_at=created_at,
-                expires_at=expires_at,
-                players=game["players"],
-                max_players=game["max_players"],
-                match_result=game.get("match_result")
-            ))
-        return games
+            entry = await listing_flights.do((cache_key, version), build_listing)
+        return listing_response(entry, current_user, if_none_match)
     except Exception as e:
         print(f"Error fetching games: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/games/history", response_model=GamePage)
+async def get_game_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    party_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Archived games only; the live listings above never include them
+    if archive_collection is None:
+        raise HTTPException(status_code=500, detail="Database not connected")
+    try:
+        query = {}
+        if party_id:
+            query["party_id"] = party_id
+        if cursor:
+            query.update(games_after_cursor(cursor))
+        page, next_cursor = await fetch_game_page(archive_collection, query, limit)
+
+        # Archived games are never open, so there is nothing to mask
+        current_time = datetime.utcnow()
+        return Response(
+            content=json_bytes({
+                "games": [serialize_game(game, current_time) for game in page],
+                "next_cursor": next_cursor
+            }),
+            media_type="application/json"
+        )
+    except Exception as e:
+        print(f"Error fetching game history: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/ready", include_in_schema=False)
+async def readiness():
+    # For load balancers: 503 while starting, draining or without MongoDB
+    pool = {"max_size": MONGO_MAX_POOL_SIZE, "min_size": MONGO_MIN_POOL_SIZE, **pool_stats.snapshot()}
+    body = {"status": "ready", "pid": os.getpid(), "pool": pool, "hash_queue_depth": password_hasher.queue_depth}
+    if draining:
+        body["status"] = "draining"
+    elif client is None:
+        body["status"] = "starting"
+    else:
+        try:
+            started = time.perf_counter()
+            await client.admin.command("ping")
+            body["ping_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        except Exception as e:
+            print(f"Error checking readiness: {str(e)}")
+            body["status"] = "unavailable"
+    return Response(
+        content=json_bytes(body),
+        status_code=200 if body["status"] == "ready" else 503,
+        media_type="application/json"
+    )
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    if WEB_CONCURRENCY > 1:
+        print("Matchmaking is disabled: its queues are per process and need a single worker")
+    if WEB_CONCURRENCY > 1 and EVENT_BROKER == "memory":
+        print("Warning: with several workers, set EVENT_BROKER=mongo so game events reach every worker")
+    # Workers need an import string so each process builds its own app
+    uvicorn.run(
+        "main:app" if WEB_CONCURRENCY > 1 else app,
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT_SECONDS
+    )
 
 
 
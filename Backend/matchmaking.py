@@ -0,0 +1,193 @@
+import bisect
+import heapq
+import itertools
+import os
+import time
+import uuid
+from cache import TTLCache
+
+MATCHMAKING_MODE = os.getenv("MATCHMAKING_MODE", "fifo")
+MATCHMAKING_RATING_WINDOW = float(os.getenv("MATCHMAKING_RATING_WINDOW", "200"))
+MATCHMAKING_TICKET_TTL = float(os.getenv("MATCHMAKING_TICKET_TTL", "600"))
+
+
+class Ticket:
+    __slots__ = (
+        "ticket_id", "user_id", "user_name", "party_id", "party_name",
+        "format", "game_type", "rating", "enqueued_at", "seq"
+    )
+
+    def __init__(self, user_id, user_name, party_id, party_name, format, game_type, rating, seq):
+        self.ticket_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.user_name = user_name
+        self.party_id = party_id
+        self.party_name = party_name
+        self.format = format
+        self.game_type = game_type
+        self.rating = rating
+        self.enqueued_at = time.time()
+        self.seq = seq
+
+
+class MatchQueue:
+    """Waiting tickets for one (format, game_type) pair.
+
+    Tickets are indexed twice: a heap on arrival order for FIFO pairing and
+    a list sorted by rating for window pairing. Finding a place in the
+    rating list is a binary search, but inserting or deleting there shifts
+    the rest of the list, so add and remove are O(n) (a memmove, cheap at
+    the queue sizes one process sees). Cancelled tickets are dropped from
+    the heap lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self._fifo = []
+        self._by_rating = []
+        self._tickets = {}
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def add(self, ticket):
+        self._tickets[ticket.ticket_id] = ticket
+        heapq.heappush(self._fifo, (ticket.seq, ticket.ticket_id))
+        bisect.insort(self._by_rating, (ticket.rating, ticket.seq, ticket.ticket_id))
+
+    def remove(self, ticket):
+        if self._tickets.pop(ticket.ticket_id, None) is None:
+            return
+        key = (ticket.rating, ticket.seq, ticket.ticket_id)
+        index = bisect.bisect_left(self._by_rating, key)
+        if index < len(self._by_rating) and self._by_rating[index] == key:
+            del self._by_rating[index]
+
+    def oldest(self):
+        while self._fifo:
+            _, ticket_id = self._fifo[0]
+            ticket = self._tickets.get(ticket_id)
+            if ticket is not None:
+                return ticket
+            heapq.heappop(self._fifo)
+        return None
+
+    def closest(self, rating, window):
+        index = bisect.bisect_left(self._by_rating, (rating,))
+        best = None
+        for candidate in (index - 1, index):
+            if 0 <= candidate < len(self._by_rating):
+                candidate_rating, _, ticket_id = self._by_rating[candidate]
+                distance = abs(candidate_rating - rating)
+                if distance <= window and (best is None or distance < best[0]):
+                    best = (distance, self._tickets[ticket_id])
+        return best[1] if best else None
+
+
+class MatchmakingEngine:
+    """Pairs queued players per (format, game_type), in process.
+
+    ``enqueue`` either returns an opponent straight away, removing both
+    tickets from the queue, or leaves the new ticket waiting; ``match``
+    finds the next opponent when the caller turns one down. Matched game
+    ids are remembered for a while so waiting players can poll for them.
+    """
+
+    def __init__(self, mode=MATCHMAKING_MODE, rating_window=MATCHMAKING_RATING_WINDOW, ticket_ttl=MATCHMAKING_TICKET_TTL):
+        if mode not in ("fifo", "rating"):
+            raise ValueError(f"Unknown matchmaking mode: {mode}")
+        self.mode = mode
+        self.rating_window = rating_window
+        self.ticket_ttl = ticket_ttl
+        self.matched = 0
+        self._queues = {}
+        self._tickets = {}
+        self._matches = TTLCache(maxsize=100000, ttl=ticket_ttl)
+        self._seq = itertools.count()
+
+    def _queue(self, format, game_type):
+        key = (format, game_type)
+        if key not in self._queues:
+            self._queues[key] = MatchQueue()
+        return self._queues[key]
+
+    def _expired(self, ticket):
+        return time.time() - ticket.enqueued_at > self.ticket_ttl
+
+    def _drop(self, ticket):
+        self._queue(ticket.format, ticket.game_type).remove(ticket)
+        self._tickets.pop(ticket.user_id, None)
+
+    def ticket_for(self, user_id):
+        ticket = self._tickets.get(user_id)
+        if ticket is not None and self._expired(ticket):
+            self._drop(ticket)
+            return None
+        return ticket
+
+    def _prune(self, queue):
+        # Tickets expire in arrival order, so expired ones are the oldest
+        while True:
+            ticket = queue.oldest()
+            if ticket is None or not self._expired(ticket):
+                return
+            self._drop(ticket)
+
+    def prune_expired(self):
+        for queue in self._queues.values():
+            self._prune(queue)
+
+    def _find_opponent(self, queue, ticket):
+        while True:
+            if self.mode == "rating":
+                opponent = queue.closest(ticket.rating, self.rating_window)
+            else:
+                opponent = queue.oldest()
+            if opponent is None or not self._expired(opponent):
+                return opponent
+            self._drop(opponent)
+
+    def enqueue(self, user_id, user_name, format, game_type, party_id=None, party_name=None, rating=0.0):
+        if self.ticket_for(user_id) is not None:
+            raise ValueError("Already in queue")
+        self._matches.invalidate(user_id)
+        self.prune_expired()
+
+        ticket = Ticket(user_id, user_name, party_id, party_name, format, game_type, rating, next(self._seq))
+        return ticket, self.match(ticket)
+
+    def match(self, ticket):
+        # Takes an opponent for a ticket that is not queued, or queues it.
+        # Callers that turn the opponent down call this again for the next one.
+        queue = self._queue(ticket.format, ticket.game_type)
+        opponent = self._find_opponent(queue, ticket)
+        if opponent is not None:
+            self._drop(opponent)
+            return opponent
+
+        queue.add(ticket)
+        self._tickets[ticket.user_id] = ticket
+        return None
+
+    def requeue(self, ticket):
+        # Put a ticket back with its original place in line
+        self._queue(ticket.format, ticket.game_type).add(ticket)
+        self._tickets[ticket.user_id] = ticket
+
+    def cancel(self, user_id):
+        ticket = self.ticket_for(user_id)
+        if ticket is None:
+            return False
+        self._drop(ticket)
+        return True
+
+    def record_match(self, game_id, *tickets):
+        self.matched += 1
+        for ticket in tickets:
+            self._matches.set(ticket.user_id, game_id)
+
+    def matched_game(self, user_id):
+        return self._matches.get(user_id)
+
+    def queue_sizes(self):
+        self.prune_expired()
+        return {key: len(queue) for key, queue in self._queues.items()}
@@ -0,0 +1,88 @@
+import os
+from bson import ObjectId
+from pymongo import DESCENDING
+from cache import TTLCache
+
+# Invalidation is per process, so the TTL bounds how long another worker's
+# membership change or deletion can go unseen
+PARTY_CACHE_SIZE = int(os.getenv("PARTY_CACHE_SIZE", "10000"))
+PARTY_CACHE_TTL = float(os.getenv("PARTY_CACHE_TTL", "30"))
+
+PARTY_FIELDS = {"name": 1, "creator_id": 1, "members": 1}
+
+_MISSING = object()
+
+
+def party_entry(party):
+    return {
+        "_id": party["_id"],
+        "name": party["name"],
+        "creator_id": party["creator_id"],
+        "members": list(party["members"]),
+        "member_count": len(party["members"]),
+    }
+
+
+class PartyCache:
+    """Read-through cache of parties by id, and of the largest party each
+    user leads.
+
+    Entries hold the name, creator, members and member count. They are
+    shared between requests, so callers must not modify them. Writers call
+    ``invalidate`` with the party and its creator after changing either.
+    """
+
+    def __init__(self, maxsize=PARTY_CACHE_SIZE, ttl=PARTY_CACHE_TTL):
+        self.collection = None
+        self.by_id = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.by_creator = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def start(self, collection):
+        self.collection = collection
+        self.clear()
+
+    async def get(self, party_id):
+        # Raises like ObjectId() for malformed ids; missing parties are not cached
+        party = self.by_id.get(party_id)
+        if party is None:
+            document = await self.collection.find_one({"_id": ObjectId(party_id)}, PARTY_FIELDS)
+            if document is None:
+                return None
+            party = party_entry(document)
+            self.by_id.set(party_id, party)
+        return party
+
+    async def largest_led_by(self, creator_id):
+        # One probe of the (creator_id, member_count) index; None when the
+        # user leads no party, which is cached too
+        party = self.by_creator.get(creator_id, _MISSING)
+        if party is _MISSING:
+            document = await self.collection.find_one(
+                {"creator_id": creator_id},
+                PARTY_FIELDS,
+                sort=[("member_count", DESCENDING)]
+            )
+            party = party_entry(document) if document is not None else None
+            self.by_creator.set(creator_id, party)
+            if party is not None:
+                self.by_id.set(str(party["_id"]), party)
+        return party
+
+    def invalidate(self, party_id=None, creator_id=None):
+        if party_id is not None:
+            self.by_id.invalidate(party_id)
+        if creator_id is not None:
+            self.by_creator.invalidate(creator_id)
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_creator.clear()
+
+
+async def backfill_member_counts(collection):
+    """Add member_count to parties created before the field existed."""
+    result = await collection.update_many(
+        {"member_count": {"$exists": False}},
+        [{"$set": {"member_count": {"$size": "$members"}}}]
+    )
+    return result.modified_count
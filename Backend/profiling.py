@@ -0,0 +1,286 @@
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pymongo import monitoring
+from metrics import is_event_stream
+
+# Fraction of requests to profile; 0 leaves sampling off
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "50"))
+# Requests slower than this go to the slow-request log; 0 disables it
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+# JSON lines file; printed to stdout when unset
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "")
+# Also unlocks X-Profile and the /debug/profiling endpoint; unset disables both
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+PROFILE_HEADER = b"x-profile"
+EVENT_STREAM = b"text/event-stream"
+MAX_TRACED_COMMANDS = 50
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class ProfilerSettings:
+    """Knobs that can be changed while the server runs."""
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, slow_request_ms=SLOW_REQUEST_MS):
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+
+
+class RequestTrace:
+    __slots__ = ("stages", "commands", "dropped_commands")
+
+    def __init__(self):
+        self.stages = {}
+        self.commands = []
+        self.dropped_commands = 0
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_command(self, command):
+        if len(self.commands) < MAX_TRACED_COMMANDS:
+            self.commands.append(command)
+        else:
+            self.dropped_commands += 1
+
+
+@contextmanager
+def stage(name):
+    """Adds the wall time of the block, awaits included, to the current
+    request's breakdown. Costs one context variable lookup when the request
+    is not traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, time.perf_counter() - started)
+
+
+def _command_filter(command_name, command):
+    if command_name == "update":
+        return [update.get("q") for update in command.get("updates", [])]
+    if command_name == "delete":
+        return [delete.get("q") for delete in command.get("deletes", [])]
+    if command_name == "aggregate":
+        return command.get("pipeline")
+    # find, count, distinct and findAndModify
+    return command.get("filter", command.get("query"))
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    """Records each command a traced request issues, with its filter.
+
+    Motor runs the driver in a thread pool but copies the caller's context
+    into it, so the request's trace is visible here.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        target = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = (trace, {
+            "command": event.command_name,
+            "collection": target if isinstance(target, str) else event.command.get("collection", ""),
+            "filter": _command_filter(event.command_name, event.command),
+        })
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed=False):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        trace, command = pending
+        command["ms"] = round(event.duration_micros / 1000, 3)
+        if failed:
+            command["failed"] = True
+        trace.add_stage("mongo", event.duration_micros / 1e6)
+        trace.add_command(command)
+
+
+class ProfileRing:
+    """Keeps the last ``size`` profiles as numbered files, overwriting the
+    oldest slot once full."""
+
+    def __init__(self, directory=PROFILE_DIR, size=PROFILE_RING_SIZE):
+        self.directory = directory
+        self.size = size
+        self._next_slot = None
+
+    def _slot_after_newest(self):
+        newest, newest_slot = None, -1
+        for slot in range(self.size):
+            try:
+                modified = os.path.getmtime(self._path(slot))
+            except OSError:
+                continue
+            if newest is None or modified > newest:
+                newest, newest_slot = modified, slot
+        return (newest_slot + 1) % self.size
+
+    def _path(self, slot):
+        return os.path.join(self.directory, f"profile-{slot:04d}.json")
+
+    def write(self, record):
+        # Blocking; call from an executor
+        os.makedirs(self.directory, exist_ok=True)
+        if self._next_slot is None:
+            self._next_slot = self._slot_after_newest()
+        slot, self._next_slot = self._next_slot, (self._next_slot + 1) % self.size
+        with open(self._path(slot), "w") as f:
+            json.dump(record, f, default=str, indent=1)
+
+
+def _top_functions(profiler, limit=40):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue().splitlines()
+
+
+class ProfilingMiddleware:
+    """Traces requests for the slow-request log and profiles a sample.
+
+    Every request gets a trace while the slow log is on. A request is
+    profiled when it is sampled or sends ``X-Profile: <DEBUG_TOKEN>``; only
+    one request is profiled at a time, and since the event loop interleaves
+    requests its call stacks can include work done for others. Event
+    streams are neither profiled nor logged as slow: they stay open for as
+    long as the client is connected.
+    """
+
+    def __init__(self, app, settings, ring=None, slow_log_path=SLOW_REQUEST_LOG, debug_token=DEBUG_TOKEN):
+        self.app = app
+        self.settings = settings
+        self.ring = ring or ProfileRing()
+        self.slow_log_path = slow_log_path
+        self.debug_token = debug_token.encode()
+        self._profiling = False
+
+    def _wants_profile(self, scope):
+        if self._profiling:
+            return False
+        forced = False
+        for name, value in scope["headers"]:
+            if name == b"accept" and EVENT_STREAM in value:
+                return False
+            if self.debug_token and name == PROFILE_HEADER and value == self.debug_token:
+                forced = True
+        if forced:
+            return True
+        return self.settings.sample_rate > 0 and random.random() < self.settings.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = self._wants_profile(scope)
+        slow_ms = self.settings.slow_request_ms
+        if not profile and slow_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+        profiler = None
+
+        def stop_profiler():
+            nonlocal profiler
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+
+        async def send_with_status(message):
+            nonlocal status, streaming, profiler
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if is_event_stream(message):
+                    # A stream the client did not announce in Accept; free
+                    # the profiler now rather than when the client leaves
+                    streaming = True
+                    stop_profiler()
+                    profiler = None
+            await send(message)
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        if profile:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            stop_profiler()
+            _current_trace.reset(token)
+            if not streaming:
+                self._finish(scope, status, elapsed, trace, profiler, slow_ms)
+
+    def _finish(self, scope, status, elapsed, trace, profiler, slow_ms):
+        record = self._record(scope, status, elapsed, trace)
+        loop = asyncio.get_running_loop()
+        if profiler is not None:
+            record["profile"] = _top_functions(profiler)
+            loop.run_in_executor(None, self._write_profile, record)
+        if slow_ms > 0 and elapsed * 1000 >= slow_ms:
+            loop.run_in_executor(None, self._write_slow, {k: v for k, v in record.items() if k != "profile"})
+
+    def _record(self, scope, status, elapsed, trace):
+        route = scope.get("route")
+        stages = {name: round(seconds * 1000, 3) for name, seconds in trace.stages.items()}
+        stages["other"] = round(max(0.0, elapsed * 1000 - sum(stages.values())), 3)
+        return {
+            "at": datetime.utcnow().isoformat() + "Z",
+            "method": scope["method"],
+            "route": getattr(route, "path", None),
+            "path": scope["path"],
+            "status": status,
+            "ms": round(elapsed * 1000, 3),
+            "stages_ms": stages,
+            "mongo": trace.commands,
+            "mongo_dropped": trace.dropped_commands,
+        }
+
+    def _write_profile(self, record):
+        try:
+            self.ring.write(record)
+        except Exception as e:
+            print(f"Error writing profile: {str(e)}")
+
+    def _write_slow(self, record):
+        try:
+            line = json.dumps(record, default=str)
+            if self.slow_log_path:
+                with open(self.slow_log_path, "a") as f:
+                    f.write(line + "\n")
+            else:
+                print(f"Slow request: {line}")
+        except Exception as e:
+            print(f"Error writing slow request log: {str(e)}")
@@ -0,0 +1,209 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from sortedcontainers import SortedList
+
+DEFAULT_RATING = 1500.0
+RATING_K_FACTOR = float(os.getenv("RATING_K_FACTOR", "32"))
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "30"))
+RATING_RETRY_LEASE_SECONDS = float(os.getenv("RATING_RETRY_LEASE_SECONDS", "60"))
+
+RATING_KINDS = ("user", "party")
+
+
+def expected_score(rating, opponent_rating):
+    return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+
+def elo_delta(winner_rating, loser_rating, k=RATING_K_FACTOR):
+    # Points the winner gains and the loser gives up
+    return k * (1.0 - expected_score(winner_rating, loser_rating))
+
+
+async def supports_transactions(client):
+    # Replica sets and sharded clusters; standalone servers reject them.
+    # Servers before 4.4.2, restricted roles and mongomock refuse "hello",
+    # which is treated as no transactions rather than a failed startup
+    try:
+        hello = await client.admin.command("hello")
+    except (OperationFailure, NotImplementedError) as e:
+        print(f"Error checking transaction support: {str(e)}")
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+class Leaderboard:
+    """Ratings kept sorted by (-rating, subject_id).
+
+    The order lives in a SortedList, so an update, a rank lookup and
+    seeking to a page of the top N are each logarithmic in the number of
+    rated subjects rather than linear.
+    """
+
+    def __init__(self):
+        self._order = SortedList()
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    @staticmethod
+    def _key(entry):
+        return (-entry["rating"], entry["subject_id"])
+
+    def update(self, entry):
+        previous = self._entries.get(entry["subject_id"])
+        if previous is not None:
+            self._order.remove(self._key(previous))
+        self._entries[entry["subject_id"]] = entry
+        self._order.add(self._key(entry))
+
+    def get(self, subject_id):
+        return self._entries.get(subject_id)
+
+    def rank(self, subject_id):
+        entry = self._entries.get(subject_id)
+        if entry is None:
+            return None
+        return self._order.bisect_left(self._key(entry)) + 1
+
+    def top(self, offset=0, limit=50):
+        return [
+            (offset + position + 1, self._entries[subject_id])
+            for position, (_, subject_id) in enumerate(self._order.islice(offset, offset + limit))
+        ]
+
+
+class RatingService:
+    """Elo ratings for users (1v1) and parties (team formats).
+
+    The ratings collection is the source of truth. A result reads both
+    sides, computes the delta and writes both in one transaction, so the
+    pair changes together; a concurrent result touching either side makes
+    the transaction conflict and it is retried against the new ratings.
+    Standalone servers cannot run transactions and fall back to applying
+    the two updates separately. Every worker mirrors the collection into
+    in-memory leaderboards and picks up other workers' changes on a timer;
+    the same timer calls ``retry`` so failed updates are eventually applied.
+    """
+
+    def __init__(self, refresh_interval=LEADERBOARD_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.collection = None
+        self.client = None
+        self.transactions = False
+        self.retry = None
+        self.boards = {kind: Leaderboard() for kind in RATING_KINDS}
+        self._last_refresh = None
+        self._task = None
+
+    async def start(self, collection, client=None, retry=None):
+        self.collection = collection
+        self.client = client
+        self.retry = retry
+        self.transactions = client is not None and await supports_transactions(client)
+        if not self.transactions:
+            print("Rating updates run without transactions (MongoDB does not support them)")
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _apply(self, doc):
+        self.boards[doc["kind"]].update({
+            "subject_id": doc["subject_id"],
+            "name": doc.get("name"),
+            "rating": doc["rating"],
+            "games": doc["games"],
+            "wins": doc["wins"],
+            "losses": doc["losses"],
+        })
+
+    async def refresh(self):
+        query = {}
+        if self._last_refresh is not None:
+            # Overlap a little so writes that raced the last refresh are seen
+            query = {"updated_at": {"$gte": self._last_refresh - timedelta(seconds=5)}}
+        self._last_refresh = datetime.utcnow()
+        async for doc in self.collection.find(query):
+            self._apply(doc)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing leaderboards: {str(e)}")
+            if self.retry is not None:
+                try:
+                    await self.retry()
+                except Exception as e:
+                    print(f"Error retrying rating updates: {str(e)}")
+
+    def rating_of(self, kind, subject_id):
+        entry = self.boards[kind].get(subject_id)
+        return entry["rating"] if entry else DEFAULT_RATING
+
+    async def _apply_delta(self, kind, subject_id, name, delta, won, now, session=None):
+        name_value = {"$literal": name} if name else {"$ifNull": ["$name", None]}
+        return await self.collection.find_one_and_update(
+            {"_id": f"{kind}:{subject_id}"},
+            [{"$set": {
+                "kind": kind,
+                "subject_id": subject_id,
+                "name": name_value,
+                "rating": {"$add": [{"$ifNull": ["$rating", DEFAULT_RATING]}, delta]},
+                "games": {"$add": [{"$ifNull": ["$games", 0]}, 1]},
+                "wins": {"$add": [{"$ifNull": ["$wins", 0]}, 1 if won else 0]},
+                "losses": {"$add": [{"$ifNull": ["$losses", 0]}, 0 if won else 1]},
+                "updated_at": now,
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+
+    async def record_result(self, kind, winner_id, loser_id, winner_name=None, loser_name=None, on_applied=None):
+        # on_applied(session) runs after both writes, inside the transaction
+        # when there is one, so it can mark the result as rated atomically
+        async def apply(session=None):
+            current = {
+                doc["subject_id"]: doc["rating"]
+                async for doc in self.collection.find(
+                    {"_id": {"$in": [f"{kind}:{winner_id}", f"{kind}:{loser_id}"]}},
+                    {"subject_id": 1, "rating": 1},
+                    session=session
+                )
+            }
+            delta = elo_delta(
+                current.get(winner_id, DEFAULT_RATING),
+                current.get(loser_id, DEFAULT_RATING)
+            )
+            now = datetime.utcnow()
+            # One at a time: operations in a transaction cannot overlap
+            winner = await self._apply_delta(kind, winner_id, winner_name, delta, True, now, session)
+            loser = await self._apply_delta(kind, loser_id, loser_name, -delta, False, now, session)
+            if on_applied is not None:
+                await on_applied(session)
+            return winner, loser
+
+        if self.transactions:
+            # with_transaction retries on write conflicts and other
+            # transient errors, re-reading the ratings each time
+            async with await self.client.start_session() as session:
+                winner, loser = await session.with_transaction(apply)
+        else:
+            winner, loser = await apply()
+        self._apply(winner)
+        self._apply(loser)
+        return winner, loser
@@ -0,0 +1,31 @@
+import re
+import unicodedata
+
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).strip().casefold()
+
+
+def search_terms(name, email):
+    # Stored on every user and indexed; a prefix of any term is a match
+    return sorted({normalize(name), normalize(email)})
+
+
+def prefix_query(prefix):
+    # An anchored, case-sensitive regex on the normalized terms is turned into
+    # a range scan on the search_terms index
+    return {"search_terms": {"$regex": "^" + re.escape(normalize(prefix))}}
+
+
+async def backfill_search_terms(collection):
+    """Add search_terms to users created before the field existed."""
+    updated = 0
+    async for user in collection.find({"search_terms": {"$exists": False}}, {"name": 1, "email": 1}):
+        if "name" not in user or "email" not in user:
+            continue
+        await collection.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"search_terms": search_terms(user["name"], user["email"])}}
+        )
+        updated += 1
+    return updated
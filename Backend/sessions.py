@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+REVOCATION_POLL_SECONDS = float(os.getenv("REVOCATION_POLL_SECONDS", "5"))
+
+
+def _token_hash(token):
+    # Only the hash is stored, so a database dump does not leak live tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationSet:
+    """Revoked session ids, each remembered for as long as an access token
+    issued to the session could still be valid.
+
+    Revocations are written to a collection shared by every worker, which a
+    TTL index empties as they lapse. Each worker polls it for revocations
+    made elsewhere and keeps the live ones in memory, so checking a token
+    needs no round trip; other workers see a revocation within
+    ``poll_interval`` seconds.
+    """
+
+    def __init__(self, ttl, poll_interval=REVOCATION_POLL_SECONDS):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.collection = None
+        self._expires = {}
+        self._seen_since = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._expires)
+
+    def __contains__(self, session_id):
+        expires_at = self._expires.get(session_id)
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    async def start(self, collection, poll=True):
+        self.collection = collection
+        self._expires = {}
+        self._seen_since = None
+        await self.refresh()
+        if poll:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _prune(self, now):
+        self._expires = {key: expires_at for key, expires_at in self._expires.items() if expires_at > now}
+
+    async def add(self, session_id):
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        self._prune(now)
+        self._expires[session_id] = expires_at
+        await self.collection.update_one(
+            {"_id": session_id},
+            {"$set": {"revoked_at": now, "expires_at": expires_at}},
+            upsert=True
+        )
+
+    async def refresh(self):
+        now = datetime.utcnow()
+        query = {"expires_at": {"$gt": now}}
+        if self._seen_since is not None:
+            query["revoked_at"] = {"$gte": self._seen_since}
+        self._prune(now)
+        async for revocation in self.collection.find(query, {"expires_at": 1}):
+            self._expires[revocation["_id"]] = revocation["expires_at"]
+        # Overlap the next poll so revocations written with a slightly
+        # earlier clock, or committed late, are still picked up
+        self._seen_since = now - timedelta(seconds=self.poll_interval)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error loading revoked sessions: {str(e)}")
+
+
+class RefreshTokenStore:
+    """Rotating refresh tokens, one chain ("session") per login.
+
+    Each refresh consumes the presented token and issues the next one in the
+    same session. Presenting a token that was already used means it leaked
+    (or two clients raced), so the whole session is revoked. Documents carry
+    expires_at for the TTL index, which removes them once they expire.
+    """
+
+    def __init__(self, revoked, expire_days=REFRESH_TOKEN_EXPIRE_DAYS):
+        self.revoked = revoked
+        self.lifetime = timedelta(days=expire_days)
+        self.collection = None
+        self.issued = 0
+        self.rotated = 0
+        self.reused = 0
+
+    def start(self, collection):
+        self.collection = collection
+
+    async def issue(self, user_id, email, session_id=None):
+        """Returns (token, session_id); a new session unless one is given."""
+        session_id = session_id or secrets.token_urlsafe(16)
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": _token_hash(token),
+            "session_id": session_id,
+            "user_id": user_id,
+            "email": email,
+            "created_at": now,
+            "expires_at": now + self.lifetime,
+            "used_at": None
+        })
+        self.issued += 1
+        return token, session_id
+
+    async def rotate(self, token):
+        """Consumes ``token`` and returns (new token, session document), or
+        None when it is unknown, expired, revoked or already used."""
+        now = datetime.utcnow()
+        session = await self.collection.find_one_and_update(
+            {"_id": _token_hash(token), "used_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"used_at": now}}
+        )
+        if session is None:
+            used = await self.collection.find_one({"_id": _token_hash(token), "used_at": {"$ne": None}}, {"session_id": 1})
+            if used is not None:
+                self.reused += 1
+                await self.revoke_session(used["session_id"])
+            return None
+        new_token, _ = await self.issue(session["user_id"], session["email"], session["session_id"])
+        self.rotated += 1
+        return new_token, session
+
+    async def revoke(self, token):
+        session = await self.collection.find_one({"_id": _token_hash(token)}, {"session_id": 1})
+        if session is not None:
+            await self.revoke_session(session["session_id"])
+
+    async def revoke_session(self, session_id):
+        await self.revoked.add(session_id)
+        await self.collection.delete_many({"session_id": session_id})
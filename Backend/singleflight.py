@@ -0,0 +1,58 @@
+import asyncio
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key.
+
+    The first caller for a key runs the call; anyone asking for the same key
+    before it finishes awaits the same result (or exception) instead of
+    starting another one. Nothing is kept once the call completes.
+
+    ``invalidate`` stops in-flight calls from being joined, so a read that
+    starts after a write never picks up a result fetched before it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._generation = 0
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, function):
+        self.calls += 1
+        flight_key = (self._generation, key)
+        task = self._calls.get(flight_key)
+        if task is None:
+            self.executed += 1
+            # Run as its own task so a leader that disconnects does not
+            # cancel the call for everyone waiting on it
+            task = asyncio.ensure_future(function())
+            self._calls[flight_key] = task
+            task.add_done_callback(lambda _: self._forget(flight_key, task))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key, task):
+        if self._calls.get(flight_key) is task:
+            del self._calls[flight_key]
+        # Every waiter may have gone away; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def invalidate(self):
+        self._generation += 1
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+        }
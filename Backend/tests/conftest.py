@@ -0,0 +1,106 @@
+import asyncio
+import inspect
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Set before main is imported; nothing here connects to a real server
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SLOW_REQUEST_MS", "0")
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture
+def app_db():
+    """Points main at a fresh in-memory database without running startup
+    (no background jobs) and empties the per-process caches."""
+    mock_client = AsyncMongoMockClient()
+    main.client = mock_client
+    main.db = mock_client.userdb
+    main.collection = main.db.users
+    main.party_collection = main.db.parties
+    main.invitation_collection = main.db.invitations
+    main.game_collection = main.db.games
+    main.archive_collection = main.db.games_archive
+    main.party_cache.start(main.party_collection)
+    main.refresh_tokens.start(main.db.refresh_tokens)
+    run(main.revoked_sessions.start(main.db.revoked_sessions, poll=False))
+    main.rating_service.collection = main.db.ratings
+    main.matchmaking_engine = main.MatchmakingEngine()
+    for cache in (main.principal_cache, main.user_profile_cache, main.user_search_cache, main.listing_cache):
+        if cache is not None:
+            cache.clear()
+    return main.db
+
+
+class Interleaved:
+    """Wraps a mongomock_motor collection so every awaited call yields to
+    the event loop first.
+
+    mongomock_motor's methods never suspend, so without this
+    ``asyncio.gather`` runs each handler to completion in turn and a
+    read-check-write race can never show up.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return await attribute(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def interleaved_games(app_db):
+    """Makes concurrent handlers interleave at every games collection call."""
+    main.game_collection = Interleaved(app_db.games)
+    return main.game_collection
+
+
+@pytest.fixture
+def client(app_db):
+    return TestClient(main.app)
+
+
+def signup(client, email, name):
+    response = client.post("/signup", json={"email": email, "password": PASSWORD, "name": name})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def login(client, email):
+    response = client.post("/token", data={"username": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def auth(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+@pytest.fixture
+def make_user(client):
+    """Signs up and logs in; returns (user, headers, tokens)."""
+    def make(name):
+        user = signup(client, f"{name.lower()}@example.com", name)
+        tokens = login(client, user["email"])
+        return user, auth(tokens), tokens
+    return make
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
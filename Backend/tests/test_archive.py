@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+import main
+from archive import GameArchiver
+from conftest import run
+
+
+class ReplayedBulkWrites:
+    """mongomock 4.3 cannot apply pymongo 4.18's ReplaceOne in bulk_write,
+    so the archive collection applies each replacement on its own."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            await self._collection.replace_one(request._filter, request._doc, upsert=request._upsert)
+
+
+def game(status, age_hours, **fields):
+    return {"status": status, "expires_at": datetime.utcnow() - timedelta(hours=age_hours), **fields}
+
+
+def test_archives_only_finished_games_past_the_window_in_batches():
+    archived = []
+
+    async def scenario():
+        db = AsyncMongoMockClient().userdb
+        await db.games.insert_many(
+            [game("completed", 48) for _ in range(5)]
+            + [game("expired", 48), game("completed", 1), game("open", 48), game("in_progress", 48)]
+        )
+        archiver = GameArchiver(archive_after_hours=24, batch_size=2, on_archived=archived.append)
+        archiver.collection = db.games
+        archiver.archive_collection = ReplayedBulkWrites(db.games_archive)
+        moved = await archiver.archive_all()
+        live = sorted([doc["status"] async for doc in db.games.find({})])
+        return moved, live, await db.games_archive.count_documents({"archived_at": {"$exists": True}})
+
+    moved, live, archived_count = run(scenario())
+    assert moved == 6
+    assert live == ["completed", "in_progress", "open"]
+    assert archived_count == 6
+    assert archived == [2, 2, 2]
+
+
+def test_a_pass_interrupted_after_copying_is_repeated_safely():
+    async def scenario():
+        db = AsyncMongoMockClient().userdb
+        result = await db.games.insert_one(game("completed", 48))
+        # A previous pass copied the game but stopped before deleting it
+        await db.games_archive.insert_one({**(await db.games.find_one({})), "archived_at": datetime.utcnow()})
+        archiver = GameArchiver(archive_after_hours=24)
+        archiver.collection = db.games
+        archiver.archive_collection = ReplayedBulkWrites(db.games_archive)
+        moved = await archiver.archive_all()
+        return moved, await db.games.count_documents({}), await db.games_archive.count_documents({"_id": result.inserted_id})
+
+    assert run(scenario()) == (1, 0, 1)
+
+
+def test_history_lists_archived_games(client, make_user):
+    _, headers, _ = make_user("Alice")
+    run(main.archive_collection.insert_one({
+        "party_id": None, "party_name": "", "creator_id": "x", "creator_name": "Xavier",
+        "format": "1v1", "game_type": "deathmatch", "status": "completed",
+        "created_at": datetime.utcnow() - timedelta(days=2), "expires_at": datetime.utcnow() - timedelta(days=2),
+        "players": ["x", "y"], "max_players": 2, "archived_at": datetime.utcnow()
+    }))
+
+    response = client.get("/games/history", headers=headers)
+    assert response.status_code == 200
+    assert [entry["creator_name"] for entry in response.json()["games"]] == ["Xavier"]
+    assert client.get("/games", headers=headers).json()["games"] == []
@@ -0,0 +1,103 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conftest import run
+from events import CLOSED, RESET, GameEventHub, InProcessBroker, MongoBroker
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_subscribers_get_events_in_order_and_resume_from_an_offset():
+    async def scenario():
+        hub = GameEventHub(history_size=10)
+        await hub.start(InProcessBroker())
+        live = hub.subscribe()
+        for game_id in ("a", "b", "c"):
+            await hub.publish("game_created", game_id, format="1v1")
+        resumed = hub.subscribe(since=1)
+        return drain(live), drain(resumed), hub.version
+
+    live, resumed, version = run(scenario())
+    assert [(event["offset"], event["game_id"]) for event in live] == [(1, "a"), (2, "b"), (3, "c")]
+    assert [event["offset"] for event in resumed] == [2, 3]
+    # Bumped on publish and again on delivery
+    assert version == 6
+
+
+def test_unknown_offsets_and_slow_subscribers_are_told_to_resync():
+    async def scenario():
+        hub = GameEventHub(history_size=2, queue_size=2)
+        await hub.start(InProcessBroker())
+        slow = hub.subscribe()
+        for game_id in ("a", "b", "c", "d"):
+            await hub.publish("game_created", game_id)
+        too_old = hub.subscribe(since=0)
+        from_the_future = hub.subscribe(since=99)
+        return drain(slow), drain(too_old), drain(from_the_future)
+
+    slow, too_old, from_the_future = run(scenario())
+    assert slow[0] is RESET
+    assert too_old == [RESET]
+    assert from_the_future == [RESET]
+
+
+def test_closing_ends_every_stream_including_later_ones():
+    async def scenario():
+        hub = GameEventHub()
+        await hub.start(InProcessBroker())
+        existing = hub.subscribe()
+        await hub.publish("game_created", "a")
+        hub.close_subscriptions()
+        return drain(existing), drain(hub.subscribe())
+
+    assert run(scenario()) == ([CLOSED], [CLOSED])
+
+
+def test_mongo_broker_shares_events_between_workers():
+    async def scenario():
+        db = AsyncMongoMockClient().userdb
+        first, second = GameEventHub(), GameEventHub()
+        await first.start(MongoBroker(db, poll_interval=0.01))
+        await second.start(MongoBroker(db, poll_interval=0.01))
+        try:
+            on_first, on_second = first.subscribe(), second.subscribe()
+            await first.publish("game_created", "a")
+            await second.publish("game_joined", "a")
+            await asyncio.sleep(0.1)
+            return drain(on_first), drain(on_second)
+        finally:
+            await first.stop()
+            await second.stop()
+
+    on_first, on_second = run(scenario())
+    expected = [(1, "game_created"), (2, "game_joined")]
+    assert [(event["offset"], event["type"]) for event in on_first] == expected
+    assert [(event["offset"], event["type"]) for event in on_second] == expected
+
+
+def test_mongo_broker_waits_for_a_gap_before_skipping_it():
+    async def scenario():
+        db = AsyncMongoMockClient().userdb
+        hub = GameEventHub()
+        await hub.start(MongoBroker(db, poll_interval=0.01, gap_timeout=0.2))
+        try:
+            subscription = hub.subscribe()
+            # Offset 1 was allocated by another worker that has not inserted it yet
+            await db.counters.insert_one({"_id": "game_events", "seq": 1})
+            await hub.publish("game_created", "b")
+            await asyncio.sleep(0.1)
+            held = drain(subscription)
+            await asyncio.sleep(0.3)
+            return held, drain(subscription)
+        finally:
+            await hub.stop()
+
+    held, delivered = run(scenario())
+    assert held == []
+    assert [event["offset"] for event in delivered] == [2]
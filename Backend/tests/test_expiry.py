@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from conftest import run
+from expiry import ExpiryScheduler
+
+
+def games_collection():
+    return AsyncMongoMockClient().userdb.games
+
+
+def test_sweep_expires_overdue_games_and_schedules_the_next_ones():
+    async def scenario():
+        games = games_collection()
+        now = datetime.utcnow()
+        await games.insert_many([
+            {"_id": "overdue", "status": "open", "expires_at": now - timedelta(seconds=1)},
+            {"_id": "soon", "status": "open", "expires_at": now + timedelta(seconds=30)},
+            {"_id": "later", "status": "open", "expires_at": now + timedelta(hours=1)},
+            {"_id": "joined", "status": "in_progress", "expires_at": now - timedelta(seconds=1)},
+        ])
+        scheduler = ExpiryScheduler(sweep_interval=60)
+        scheduler.collection = games
+        await scheduler._sweep(now)
+        statuses = {game["_id"]: game["status"] async for game in games.find({})}
+        return scheduler, statuses
+
+    scheduler, statuses = run(scenario())
+    assert statuses == {"overdue": "expired", "soon": "open", "later": "open", "joined": "in_progress"}
+    assert scheduler.expired_count == 1
+    # Only deadlines before the next sweep are held in memory
+    assert [game_id for _, game_id in scheduler._heap] == ["soon"]
+
+
+def test_due_games_are_left_alone_if_they_changed_since_being_scheduled():
+    async def scenario():
+        games = games_collection()
+        now = datetime.utcnow()
+        still_open = ObjectId()
+        joined = ObjectId()
+        await games.insert_many([
+            {"_id": still_open, "status": "open", "expires_at": now - timedelta(seconds=1)},
+            {"_id": joined, "status": "in_progress", "expires_at": now - timedelta(seconds=1)},
+        ])
+        scheduler = ExpiryScheduler()
+        scheduler.collection = games
+        for game_id in (still_open, joined, still_open):
+            scheduler.schedule(game_id, now - timedelta(seconds=1))
+        scheduled = len(scheduler)
+        await scheduler._expire_due(now)
+        statuses = [(await games.find_one({"_id": game_id}))["status"] for game_id in (still_open, joined)]
+        return scheduled, len(scheduler), statuses, scheduler.expired_count
+
+    assert run(scenario()) == (2, 0, ["expired", "in_progress"], 1)
+
+
+def test_running_scheduler_wakes_for_an_earlier_deadline():
+    async def scenario():
+        games = games_collection()
+        scheduler = ExpiryScheduler(sweep_interval=3600)
+        await scheduler.start(games)
+        try:
+            expires_at = datetime.utcnow() + timedelta(milliseconds=50)
+            result = await games.insert_one({"status": "open", "expires_at": expires_at})
+            scheduler.schedule(result.inserted_id, expires_at)
+            await asyncio.sleep(0.3)
+            return (await games.find_one({}))["status"], scheduler.expired_count
+        finally:
+            await scheduler.stop()
+
+    assert run(scenario()) == ("expired", 1)
@@ -0,0 +1,160 @@
+import asyncio
+
+import main
+from conftest import run
+
+
+def create_game(client, headers, format="1v1", game_type="deathmatch"):
+    response = client.post("/games", json={"format": format, "game_type": game_type}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def as_user(user):
+    return main.User(id=user["id"], email=user["email"], name=user["name"])
+
+
+async def gather_outcomes(*coroutines):
+    async def outcome(coroutine):
+        try:
+            return await coroutine
+        except main.HTTPException as e:
+            return e.status_code, e.detail
+    return await asyncio.gather(*(outcome(coroutine) for coroutine in coroutines))
+
+
+def test_concurrent_joins_fill_a_game_once(client, make_user, interleaved_games):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, _, _ = make_user("Bob")
+    carol, _, _ = make_user("Carol")
+    game = create_game(client, alice_headers)
+
+    # Both joins read the game before either writes
+    outcomes = run(gather_outcomes(
+        main.join_game(game["id"], current_user=as_user(bob)),
+        main.join_game(game["id"], current_user=as_user(carol)),
+    ))
+
+    assert sorted(outcomes, key=str) == sorted([{"message": "Joined game successfully"}, (400, "Game is full")], key=str)
+    stored = run(main.game_collection.find_one({}))
+    assert len(stored["players"]) == 2
+    assert stored["status"] == "in_progress"
+
+
+def test_join_reports_why_it_failed(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    game = create_game(client, alice_headers)
+
+    own = client.post(f"/games/{game['id']}/join", headers=alice_headers)
+    assert (own.status_code, own.json()["detail"]) == (400, "You are already in this game")
+
+    team_game = run(main.game_collection.insert_one({
+        **{k: v for k, v in run(main.game_collection.find_one({})).items() if k != "_id"},
+        "format": "5v5",
+        "max_players": 10,
+    }))
+    team = client.post(f"/games/{team_game.inserted_id}/join", headers=bob_headers)
+    assert (team.status_code, team.json()["detail"]) == (400, "You must be a party creator to join team format games")
+
+    missing = client.post(f"/games/{main.ObjectId()}/join", headers=bob_headers)
+    assert missing.status_code == 404
+
+
+def test_concurrent_ready_ups_start_the_game_once(interleaved_games):
+    players = [str(main.ObjectId()) for _ in range(10)]
+    result = run(main.game_collection.insert_one({"status": "in_progress", "players": players, "format": "5v5", "party_id": None}))
+    game_id = str(result.inserted_id)
+
+    outcomes = run(gather_outcomes(*(
+        main.ready_up(game_id, current_user=main.User(id=player, email="p@example.com", name="P"))
+        for player in players
+    )))
+
+    assert sorted(outcome["ready_count"] for outcome in outcomes) == list(range(1, 11))
+    assert [outcome["message"] for outcome in outcomes].count("All players ready, game can start!") == 1
+    stored = run(main.game_collection.find_one({}))
+    assert stored["status"] == "ready_to_start"
+
+
+def test_open_games_mask_the_creator_for_other_viewers(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    _, bob_headers, _ = make_user("Bob")
+    create_game(client, alice_headers)
+
+    seen_by_bob = client.get("/games", params={"expand": "players"}, headers=bob_headers).json()["games"][0]
+    assert seen_by_bob["creator_name"] == "Anonymous"
+    assert seen_by_bob["player_profiles"] == [{"id": alice["id"], "name": "Anonymous"}]
+
+    seen_by_alice = client.get("/games", params={"expand": "players"}, headers=alice_headers).json()["games"][0]
+    assert seen_by_alice["creator_name"] == "Alice"
+    assert seen_by_alice["player_profiles"] == [{"id": alice["id"], "name": "Alice"}]
+
+
+def test_listing_etag_revalidates_until_a_game_changes(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    _, bob_headers, _ = make_user("Bob")
+    game = create_game(client, alice_headers)
+
+    first = client.get("/games", headers=bob_headers)
+    etag = first.headers["etag"]
+    assert client.get("/games", headers={**bob_headers, "If-None-Match": etag}).status_code == 304
+    # The creator sees an unmasked body, so Bob's tag does not match theirs
+    assert client.get("/games", headers={**alice_headers, "If-None-Match": etag}).status_code == 200
+
+    client.post(f"/games/{game['id']}/join", headers=bob_headers)
+    changed = client.get("/games", headers={**bob_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["games"][0]["status"] == "in_progress"
+
+
+def test_status_filter_accepts_ready_to_start(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    create_game(client, alice_headers)
+    run(main.game_collection.update_one({}, {"$set": {"status": "ready_to_start"}}))
+
+    response = client.get("/games", params={"status": "ready_to_start"}, headers=alice_headers)
+    assert response.status_code == 200
+    assert [game["status"] for game in response.json()["games"]] == ["ready_to_start"]
+
+
+def test_team_join_makes_the_leaders_party_team_two(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    members = [bob["id"]] + [str(main.ObjectId()) for _ in range(4)]
+    party = run(main.party_collection.insert_one({
+        "name": "Bob's team", "creator_id": bob["id"], "members": members, "member_count": len(members)
+    }))
+    one_v_one = create_game(client, alice_headers)
+    team_game = run(main.game_collection.insert_one({
+        **{k: v for k, v in run(main.game_collection.find_one({})).items() if k != "_id"},
+        "format": "5v5",
+        "max_players": 10,
+    }))
+
+    assert client.post(f"/games/{team_game.inserted_id}/join", headers=bob_headers).status_code == 200
+    assert client.post(f"/games/{one_v_one['id']}/join", headers=bob_headers).status_code == 200
+
+    joined_team = run(main.game_collection.find_one({"_id": team_game.inserted_id}))
+    joined_one_v_one = run(main.game_collection.find_one({"_id": main.ObjectId(one_v_one["id"])}))
+    assert joined_team["team2_party_id"] == str(party.inserted_id)
+    assert joined_one_v_one["team2_party_id"] is None
+
+
+def test_too_small_party_cannot_join_a_team_game(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    run(main.party_collection.insert_one({
+        "name": "Bob's team", "creator_id": bob["id"], "members": [bob["id"]], "member_count": 1
+    }))
+    create_game(client, alice_headers)
+    team_game = run(main.game_collection.insert_one({
+        **{k: v for k, v in run(main.game_collection.find_one({})).items() if k != "_id"},
+        "format": "5v5",
+        "max_players": 10,
+    }))
+
+    response = client.post(f"/games/{team_game.inserted_id}/join", headers=bob_headers)
+    assert (response.status_code, response.json()["detail"]) == (
+        400, "You need a party with at least 5 members to join this game"
+    )
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from listing_cache import ListingCache, ListingEntry, etag_matches
+
+
+def entry(fragments):
+    return ListingEntry("abc.1", 1, None, b'{"games":[', b"]}", fragments)
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"abc.1-public"', 'W/"abc.1-public"')
+    assert etag_matches('"abc.1-public"', 'W/"abc.1-public"')
+    assert etag_matches('W/"old", W/"abc.1-public"', 'W/"abc.1-public"')
+    assert etag_matches(" * ", 'W/"abc.1-public"')
+    assert not etag_matches('W/"abc.2-public"', 'W/"abc.1-public"')
+    assert not etag_matches(None, 'W/"abc.1-public"')
+    assert not etag_matches("", 'W/"abc.1-public"')
+
+
+def test_render_unmasks_only_the_viewers_own_open_games():
+    listing = entry([
+        (b'{"creator_name":"Anonymous"}', b'{"creator_name":"Alice"}', "alice"),
+        (b'{"creator_name":"Bob"}', b'{"creator_name":"Bob"}', None),
+    ])
+
+    assert listing.render("alice") == b'{"games":[{"creator_name":"Alice"},{"creator_name":"Bob"}]}'
+    assert listing.render("carol") == b'{"games":[{"creator_name":"Anonymous"},{"creator_name":"Bob"}]}'
+    assert listing.render(None) == listing.render("carol")
+
+
+def test_etag_varies_only_for_viewers_who_see_a_different_body():
+    listing = entry([(b"{}", b"{}", "alice")])
+
+    assert listing.etag("carol") == listing.etag("dave") == 'W/"abc.1-public"'
+    assert listing.etag("alice") != listing.etag("carol")
+    assert listing.etag("alice").startswith('W/"abc.1-')
+
+
+def test_cache_drops_entries_from_an_older_version_or_past_valid_until():
+    cache = ListingCache()
+    cache.put("open", 1, None, b"[", b"]", [])
+    assert cache.get("open", 1) is not None
+    assert cache.get("open", 2) is None
+    assert cache.get("open", 1) is None
+
+    cache.put("open", 2, datetime.utcnow() - timedelta(seconds=1), b"[", b"]", [])
+    assert cache.get("open", 2) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_tags_are_not_reused():
+    cache = ListingCache()
+    first = cache.put("open", 1, None, b"[", b"]", [])
+    second = cache.put("open", 2, None, b"[", b"]", [])
+    assert first.tag != second.tag
+    assert first.tag.split(".")[0] != ListingCache().put("open", 1, None, b"[", b"]", []).tag.split(".")[0]
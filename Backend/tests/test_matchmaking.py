@@ -0,0 +1,96 @@
+import main
+from conftest import run
+from matchmaking import MatchmakingEngine
+
+
+def queue(client, headers, format="1v1", game_type="deathmatch"):
+    return client.post("/matchmaking/queue", json={"format": format, "game_type": game_type}, headers=headers)
+
+
+def test_fifo_pairs_the_longest_waiting_ticket():
+    engine = MatchmakingEngine(mode="fifo")
+    engine.enqueue("a", "A", "1v1", "deathmatch", rating=1000)
+    engine.enqueue("b", "B", "5v5", "deathmatch", rating=1000)
+
+    _, opponent = engine.enqueue("c", "C", "1v1", "deathmatch", rating=2000)
+    assert opponent.user_id == "a"
+    assert engine.ticket_for("a") is None
+    assert engine.ticket_for("c") is None
+    assert engine.ticket_for("b") is not None
+
+
+def test_rating_mode_pairs_within_the_window():
+    engine = MatchmakingEngine(mode="rating", rating_window=100)
+    engine.enqueue("a", "A", "1v1", "deathmatch", rating=1000)
+    engine.enqueue("b", "B", "1v1", "deathmatch", rating=1450)
+
+    _, opponent = engine.enqueue("c", "C", "1v1", "deathmatch", rating=1400)
+    assert opponent.user_id == "b"
+    _, opponent = engine.enqueue("d", "D", "1v1", "deathmatch", rating=1300)
+    assert opponent is None
+
+
+def test_expired_tickets_are_never_matched():
+    engine = MatchmakingEngine(ticket_ttl=60)
+    engine.enqueue("a", "A", "1v1", "deathmatch")
+    engine.ticket_for("a").enqueued_at -= 61
+
+    _, opponent = engine.enqueue("b", "B", "1v1", "deathmatch")
+    assert opponent is None
+    assert engine.queue_sizes() == {("1v1", "deathmatch"): 1}
+
+
+def test_queued_players_cannot_create_a_listing(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    assert queue(client, alice_headers).json()["status"] == "queued"
+
+    response = client.post("/games", json={"format": "1v1", "game_type": "deathmatch"}, headers=alice_headers)
+    assert (response.status_code, response.json()["detail"]) == (
+        400, "Leave the matchmaking queue before creating a game"
+    )
+    assert run(main.game_collection.count_documents({})) == 0
+
+
+def test_matched_players_cannot_create_a_listing(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    _, bob_headers, _ = make_user("Bob")
+    queue(client, alice_headers)
+    queue(client, bob_headers)
+
+    # Alice waited first, so she is the creator; Bob only plays in the game
+    for headers in (alice_headers, bob_headers):
+        response = client.post("/games", json={"format": "1v1", "game_type": "deathmatch"}, headers=headers)
+        assert (response.status_code, response.json()["detail"]) == (400, "You already have an active game listing")
+    game = run(main.game_collection.find_one({}))
+    assert game["creator_id"] == alice["id"]
+    assert run(main.game_collection.count_documents({})) == 1
+
+
+def test_busy_opponents_are_skipped(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    carol, carol_headers, _ = make_user("Carol")
+    queue(client, alice_headers)
+    # Alice joins someone else's game while she waits
+    run(main.game_collection.insert_one({"status": "in_progress", "players": [str(main.ObjectId()), alice["id"]]}))
+
+    assert queue(client, bob_headers).json()["status"] == "queued"
+    assert main.matchmaking_engine.ticket_for(alice["id"]) is None
+
+    matched = queue(client, carol_headers).json()
+    assert matched["status"] == "matched"
+    game = run(main.game_collection.find_one({"matchmade": True}))
+    assert game["players"] == [bob["id"], carol["id"]]
+
+
+def test_matchmaking_refuses_to_run_with_several_workers(client, make_user, monkeypatch):
+    _, alice_headers, _ = make_user("Alice")
+    monkeypatch.setattr(main, "WEB_CONCURRENCY", 2)
+
+    for response in (
+        queue(client, alice_headers),
+        client.get("/matchmaking/queue", headers=alice_headers),
+        client.delete("/matchmaking/queue", headers=alice_headers),
+    ):
+        assert response.status_code == 503
+    assert main.matchmaking_engine.queue_sizes() == {}
@@ -0,0 +1,143 @@
+import main
+from conftest import run
+
+
+def create_party(client, headers, name="Squad"):
+    response = client.post("/parties", json={"name": name}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_bulk_invite_reports_each_invitee(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, _, _ = make_user("Bob")
+    carol, _, _ = make_user("Carol")
+    party = create_party(client, alice_headers)
+    client.post(f"/parties/{party['id']}/invite", json={"party_id": party["id"], "invitee_id": bob["id"]}, headers=alice_headers)
+
+    response = client.post(
+        f"/parties/{party['id']}/invites",
+        json={"invitee_ids": [bob["id"], alice["id"], carol["id"], carol["id"]]},
+        headers=alice_headers
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(result["invitee_id"], result["status"]) for result in results] == [
+        (bob["id"], "already_invited"),
+        (alice["id"], "already_member"),
+        (carol["id"], "pending"),
+    ]
+    assert results[2]["invitation_id"] is not None
+    assert run(main.invitation_collection.count_documents({"invitee_id": carol["id"]})) == 1
+
+
+def test_bulk_invite_checks_the_party_and_the_batch(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    party = create_party(client, alice_headers)
+
+    not_creator = client.post(f"/parties/{party['id']}/invites", json={"invitee_ids": [bob["id"]]}, headers=bob_headers)
+    assert not_creator.status_code == 403
+
+    empty = client.post(f"/parties/{party['id']}/invites", json={"invitee_ids": []}, headers=alice_headers)
+    assert empty.status_code == 400
+
+    too_many = [str(main.ObjectId()) for _ in range(main.MAX_BULK_INVITES + 1)]
+    oversized = client.post(f"/parties/{party['id']}/invites", json={"invitee_ids": too_many}, headers=alice_headers)
+    assert oversized.status_code == 400
+    assert run(main.invitation_collection.count_documents({})) == 0
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.reads = 0
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return await self._collection.find_one(*args, **kwargs)
+
+
+def test_party_cache_reads_through_and_forgets_on_invalidate(app_db):
+    from party_cache import PartyCache
+
+    cache = PartyCache()
+    parties = CountingCollection(app_db.parties)
+    cache.start(parties)
+    result = run(app_db.parties.insert_one({"name": "Squad", "creator_id": "alice", "members": ["alice"], "member_count": 1}))
+    party_id = str(result.inserted_id)
+
+    assert run(cache.get(party_id))["name"] == "Squad"
+    assert run(cache.get(party_id))["name"] == "Squad"
+    assert run(cache.largest_led_by("bob")) is None
+    assert run(cache.largest_led_by("bob")) is None
+    assert parties.reads == 2
+
+    run(app_db.parties.update_one({"_id": result.inserted_id}, {"$set": {"name": "Renamed"}}))
+    assert run(cache.get(party_id))["name"] == "Squad"
+    cache.invalidate(party_id, "alice")
+    assert run(cache.get(party_id))["name"] == "Renamed"
+    assert run(cache.get(str(main.ObjectId()))) is None
+
+
+def test_accepting_an_invitation_is_seen_by_the_next_join(client, make_user):
+    alice, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    party = create_party(client, bob_headers)
+    # Cached while Bob's party is too small for 4v4
+    assert run(main.party_cache.largest_led_by(bob["id"]))["member_count"] == 1
+
+    teammates = []
+    for name in ("Carol", "Dave", "Erin"):
+        user, headers, _ = make_user(name)
+        invitation = client.post(
+            f"/parties/{party['id']}/invite", json={"party_id": party["id"], "invitee_id": user["id"]}, headers=bob_headers
+        ).json()
+        assert client.post(
+            f"/invitations/{invitation['invitation_id']}/respond", json={"status": "accepted"}, headers=headers
+        ).status_code == 200
+        teammates.append(user["id"])
+
+    assert run(main.party_cache.get(party["id"]))["members"] == [bob["id"], *teammates]
+    assert run(main.party_cache.largest_led_by(bob["id"]))["member_count"] == 4
+    client.post("/games", json={"format": "1v1", "game_type": "deathmatch"}, headers=alice_headers)
+    team_game = run(main.game_collection.insert_one({
+        **{k: v for k, v in run(main.game_collection.find_one({})).items() if k != "_id"},
+        "format": "4v4",
+        "max_players": 8,
+    }))
+    assert client.post(f"/games/{team_game.inserted_id}/join", headers=bob_headers).status_code == 200
+
+
+def test_member_count_moves_with_the_members(client, make_user):
+    _, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    party = create_party(client, alice_headers)
+    first = client.post(f"/parties/{party['id']}/invite", json={"party_id": party["id"], "invitee_id": bob["id"]}, headers=alice_headers).json()
+    client.post(f"/invitations/{first['invitation_id']}/respond", json={"status": "accepted"}, headers=bob_headers)
+    # A second invitation accepted after joining must not count Bob twice
+    second = run(main.invitation_collection.insert_one({
+        "party_id": party["id"], "party_name": "Squad", "inviter_id": "x", "inviter_name": "X",
+        "invitee_id": bob["id"], "status": "pending", "created_at": main.datetime.utcnow()
+    }))
+    client.post(f"/invitations/{second.inserted_id}/respond", json={"status": "accepted"}, headers=bob_headers)
+
+    stored = run(main.party_collection.find_one({}))
+    assert stored["member_count"] == len(stored["members"]) == 2
+
+
+def test_largest_led_by_prefers_the_biggest_party_and_backfill_fills_counts(app_db):
+    from party_cache import backfill_member_counts
+
+    run(app_db.parties.insert_many([
+        {"name": "Small", "creator_id": "alice", "members": ["alice", "b"]},
+        {"name": "Big", "creator_id": "alice", "members": ["alice", "b", "c", "d"]},
+        {"name": "Other", "creator_id": "bob", "members": ["bob"], "member_count": 1},
+    ]))
+
+    assert run(backfill_member_counts(app_db.parties)) == 2
+    assert run(main.party_cache.largest_led_by("alice"))["name"] == "Big"
@@ -0,0 +1,93 @@
+from mongomock_motor import AsyncMongoMockClient
+
+from conftest import run
+from ratings import DEFAULT_RATING, Leaderboard, RatingService, elo_delta
+
+
+def entry(subject_id, rating):
+    return {"subject_id": subject_id, "name": subject_id, "rating": rating, "games": 1, "wins": 0, "losses": 0}
+
+
+def test_elo_delta_favours_the_underdog():
+    assert elo_delta(1500, 1500) == 16
+    assert elo_delta(1400, 1600) > 16 > elo_delta(1600, 1400)
+
+
+def test_leaderboard_keeps_ranks_as_ratings_change():
+    board = Leaderboard()
+    for subject_id, rating in (("a", 1500), ("b", 1600), ("c", 1400), ("d", 1500)):
+        board.update(entry(subject_id, rating))
+
+    assert [(rank, e["subject_id"]) for rank, e in board.top()] == [(1, "b"), (2, "a"), (3, "d"), (4, "c")]
+    assert board.rank("d") == 3
+
+    board.update(entry("c", 1700))
+    assert len(board) == 4
+    assert board.rank("c") == 1
+    assert [e["subject_id"] for _, e in board.top(offset=1, limit=2)] == ["b", "a"]
+    assert board.rank("missing") is None
+
+
+def test_record_result_moves_both_sides_without_transactions():
+    async def scenario():
+        service = RatingService()
+        service.collection = AsyncMongoMockClient().userdb.ratings
+        await service.record_result("user", "winner", "loser", "Winner", "Loser")
+        await service.record_result("user", "winner", "loser")
+        return service
+
+    service = run(scenario())
+    board = service.boards["user"]
+    winner, loser = board.get("winner"), board.get("loser")
+    assert winner["rating"] + loser["rating"] == 2 * DEFAULT_RATING
+    assert winner["rating"] > DEFAULT_RATING + 16
+    assert (winner["wins"], winner["games"], loser["losses"]) == (2, 2, 2)
+    assert winner["name"] == "Winner"
+    assert board.rank("winner") == 1
+
+
+def test_failed_rating_update_is_retried_until_applied(client, make_user, monkeypatch):
+    import main
+    from datetime import datetime, timedelta
+
+    alice, alice_headers, _ = make_user("Alice")
+    bob, bob_headers, _ = make_user("Bob")
+    game = client.post("/games", json={"format": "1v1", "game_type": "deathmatch"}, headers=alice_headers).json()
+    client.post(f"/games/{game['id']}/join", headers=bob_headers)
+
+    async def unavailable(*args, **kwargs):
+        raise RuntimeError("ratings unavailable")
+    record_result = main.rating_service.record_result
+    monkeypatch.setattr(main.rating_service, "record_result", unavailable)
+    response = client.post(f"/games/{game['id']}/result", json={
+        "winner_id": alice["id"], "winner_name": "Alice", "loser_id": bob["id"], "loser_name": "Bob", "score": "13-7"
+    }, headers=alice_headers)
+    assert response.status_code == 200
+
+    stored = run(main.game_collection.find_one({}))
+    assert stored["status"] == "completed" and stored["ratings_pending"] is True
+    # Still leased to the request that made the first attempt
+    run(main.retry_pending_ratings())
+    assert main.rating_service.boards["user"].get(alice["id"]) is None
+
+    monkeypatch.setattr(main.rating_service, "record_result", record_result)
+    run(main.game_collection.update_one({}, {"$set": {"ratings_retry_at": datetime.utcnow() - timedelta(seconds=1)}}))
+    run(main.retry_pending_ratings())
+
+    stored = run(main.game_collection.find_one({}))
+    assert "ratings_pending" not in stored and "ratings_retry_at" not in stored
+    assert main.rating_service.boards["user"].get(alice["id"])["wins"] == 1
+    assert main.rating_service.boards["user"].get(bob["id"])["losses"] == 1
+
+
+def test_pending_results_are_not_archived(app_db):
+    from datetime import datetime, timedelta
+    from archive import GameArchiver
+
+    expired_at = datetime.utcnow() - timedelta(days=2)
+    run(app_db.games.insert_one({"status": "completed", "expires_at": expired_at, "ratings_pending": True}))
+    archiver = GameArchiver(archive_after_hours=24)
+    archiver.collection = app_db.games
+    archiver.archive_collection = app_db.games_archive
+
+    assert run(archiver.archive_all()) == 0
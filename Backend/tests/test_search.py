@@ -0,0 +1,52 @@
+import main
+from conftest import run
+from search import backfill_search_terms, normalize, search_terms
+
+
+def search(client, headers, q, **params):
+    response = client.get("/users/search", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [user["name"] for user in response.json()]
+
+
+def test_terms_are_normalized():
+    assert normalize("  ÅLICE ") == "ålice"
+    assert normalize("ｆｕｌｌ") == "full"
+    assert search_terms("Alice", "Alice@Example.com") == ["alice", "alice@example.com"]
+
+
+def test_prefix_matches_name_or_email_case_insensitively(client, make_user):
+    _, headers, _ = make_user("Alice")
+    make_user("Albert")
+    make_user("Bob")
+
+    assert search(client, headers, "AL") == ["Albert", "Alice"]
+    assert search(client, headers, "bob@") == ["Bob"]
+    assert search(client, headers, "lice") == []
+    assert search(client, headers, "al", limit=1) in (["Albert"], ["Alice"])
+
+
+def test_regex_characters_are_matched_literally(client, make_user):
+    _, headers, _ = make_user("Alice")
+    make_user("A.ron")
+
+    assert search(client, headers, "a.") == ["A.ron"]
+    assert search(client, headers, ".*") == []
+
+
+def test_new_users_show_up_in_cached_results(client, make_user):
+    _, headers, _ = make_user("Alice")
+    assert search(client, headers, "al") == ["Alice"]
+
+    make_user("Albert")
+    assert search(client, headers, "al") == ["Albert", "Alice"]
+
+
+def test_backfill_adds_terms_to_older_users(app_db):
+    run(main.collection.insert_many([
+        {"name": "Old", "email": "old@example.com"},
+        {"name": "New", "email": "new@example.com", "search_terms": ["new", "new@example.com"]},
+    ]))
+
+    assert run(backfill_search_terms(main.collection)) == 1
+    assert run(main.collection.find_one({"name": "Old"}))["search_terms"] == ["old", "old@example.com"]
@@ -0,0 +1,110 @@
+import main
+from conftest import run
+from sessions import RefreshTokenStore, RevocationSet
+
+
+def refresh(client, refresh_token):
+    return client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+def bearer(access_token):
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def test_refresh_rotates_the_token(client, make_user):
+    _, headers, tokens = make_user("Alice")
+
+    rotated = refresh(client, tokens["refresh_token"])
+    assert rotated.status_code == 200
+    pair = rotated.json()
+    assert pair["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/profile", headers=bearer(pair["access_token"])).status_code == 200
+    assert client.get("/profile", headers=headers).status_code == 200
+    assert refresh(client, pair["refresh_token"]).status_code == 200
+
+
+def test_reusing_a_refresh_token_revokes_the_session(client, make_user):
+    _, headers, tokens = make_user("Alice")
+    pair = refresh(client, tokens["refresh_token"]).json()
+    reused_before = main.refresh_tokens.reused
+
+    reused = refresh(client, tokens["refresh_token"])
+    assert reused.status_code == 401
+    assert main.refresh_tokens.reused == reused_before + 1
+    # Everything issued to the session stops working, including the
+    # refresh token the legitimate client was about to use
+    assert refresh(client, pair["refresh_token"]).status_code == 401
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert client.get("/profile", headers=bearer(pair["access_token"])).status_code == 401
+    assert run(main.refresh_tokens.collection.count_documents({})) == 0
+
+
+def test_reuse_leaves_other_sessions_alone(client, make_user):
+    user, _, tokens = make_user("Alice")
+    other = client.post("/token", data={"username": user["email"], "password": "test-password"}).json()
+
+    refresh(client, tokens["refresh_token"])
+    refresh(client, tokens["refresh_token"])
+
+    assert client.get("/profile", headers=bearer(other["access_token"])).status_code == 200
+    assert refresh(client, other["refresh_token"]).status_code == 200
+
+
+def test_revoke_logs_the_session_out(client, make_user):
+    _, headers, tokens = make_user("Alice")
+
+    response = client.post("/token/revoke", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_unknown_refresh_token_is_rejected_without_revoking_anything(client, make_user):
+    _, headers, _ = make_user("Alice")
+    reused_before = main.refresh_tokens.reused
+
+    assert refresh(client, "not-a-token").status_code == 401
+    assert main.refresh_tokens.reused == reused_before
+    assert client.get("/profile", headers=headers).status_code == 200
+
+
+def test_stream_ticket_is_not_a_bearer_token(client, make_user):
+    _, headers, _ = make_user("Alice")
+
+    ticket = client.post("/games/events/ticket", headers=headers).json()["ticket"]
+    assert client.get("/profile", headers=bearer(ticket)).status_code == 401
+
+
+def session_of(access_token):
+    return main.decode(access_token, main.SECRET_KEY, algorithms=[main.ALGORITHM])["sid"]
+
+
+def test_revocation_reaches_other_workers(client, make_user):
+    _, headers, tokens = make_user("Alice")
+    # Another worker with its own in-memory view of the same database
+    other_revoked = RevocationSet(ttl=60, poll_interval=1)
+    run(other_revoked.start(main.db.revoked_sessions, poll=False))
+    other_tokens = RefreshTokenStore(other_revoked)
+    other_tokens.start(main.db.refresh_tokens)
+
+    run(other_tokens.revoke(tokens["refresh_token"]))
+    assert session_of(tokens["access_token"]) in other_revoked
+    assert client.get("/profile", headers=headers).status_code == 200
+
+    # This worker picks the revocation up on its next poll
+    run(main.revoked_sessions.refresh())
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_a_starting_worker_loads_live_revocations_only(app_db):
+    run(app_db.revoked_sessions.insert_many([
+        {"_id": "live", "revoked_at": main.datetime.utcnow(), "expires_at": main.datetime.utcnow() + main.timedelta(minutes=5)},
+        {"_id": "lapsed", "revoked_at": main.datetime.utcnow(), "expires_at": main.datetime.utcnow() - main.timedelta(seconds=1)},
+    ]))
+    revoked = RevocationSet(ttl=60)
+    run(revoked.start(app_db.revoked_sessions, poll=False))
+
+    assert "live" in revoked
+    assert "lapsed" not in revoked
+    assert len(revoked) == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from conftest import run
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "games"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("open", fetch) for _ in range(5)))
+
+    assert run(scenario()) == ["games"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 4
+    assert flight.in_flight == 0
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("database down")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("open", fail) for _ in range(3)), return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.executed == 1
+
+
+def test_invalidate_starts_a_fresh_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        call = len(calls)
+        await asyncio.sleep(0.01)
+        return call
+
+    async def scenario():
+        before = asyncio.ensure_future(flight.do("open", fetch))
+        await asyncio.sleep(0)
+        flight.invalidate()
+        after = await flight.do("open", fetch)
+        return await before, after
+
+    assert run(scenario()) == (1, 2)
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "games"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("open", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("open", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert run(scenario()) == "games"
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import main
+
+
+def test_app_starts_on_a_server_without_transactions(monkeypatch):
+    # mongomock does not implement "hello", like servers before 4.4.2
+    monkeypatch.setattr(main, "AsyncIOMotorClient", lambda url, **kwargs: AsyncMongoMockClient())
+    monkeypatch.setattr(main, "draining", False)
+
+    with TestClient(main.app) as client:
+        assert client.get("/ready").json()["status"] == "ready"
+        assert main.rating_service.transactions is False
+
+        client.post("/signup", json={"email": "alice@example.com", "password": "test-password", "name": "Alice"})
+        tokens = client.post("/token", data={"username": "alice@example.com", "password": "test-password"}).json()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/leaderboard/users", headers=headers).status_code == 200
+
+    monkeypatch.setattr(main, "draining", False)